@@ -0,0 +1,169 @@
+"""Local stand-in for the OpenAI Realtime API.
+
+Speaks the subset of the realtime event protocol the relay in main.py
+uses, with scripted responses, so the relay can be exercised and
+benchmarked without a network connection or an API key:
+
+    python bench/fake_realtime.py --port 9000
+    OPENAI_REALTIME_URL=ws://127.0.0.1:9000 python main.py
+
+Every input_audio_buffer.commit is treated as a finished user turn: the
+server sends a transcription, then either a spoken reply or (every
+--tool-every turns) a batch of parallel function calls, answering once
+the relay has sent the outputs and a response.create.
+"""
+import json
+import base64
+import asyncio
+import argparse
+import itertools
+import websockets
+
+SAMPLE_RATE = 24000
+
+
+class FakeRealtimeServer:
+    def __init__(
+        self,
+        tools: list = None,
+        tool_every: int = 3,
+        audio_chunks: int = 10,
+        chunk_ms: int = 100,
+        first_delta_delay_ms: float = 0.0,
+        paced: bool = False
+    ):
+        self.tools = tools if tools is not None else ["get_weekly_summary", "get_goals"]
+        self.tool_every = tool_every
+        self.audio_chunks = audio_chunks
+        self.chunk_ms = chunk_ms
+        self.first_delta_delay = first_delta_delay_ms / 1000
+        self.paced = paced
+
+        # One chunk of near-silent PCM16, encoded once and reused
+        samples = SAMPLE_RATE * chunk_ms // 1000
+        self.audio_delta = base64.b64encode(b"\x01\x00" * samples).decode()
+        self._ids = itertools.count(1)
+
+        self.connections = 0
+        self.audio_bytes_received = 0
+
+    def _id(self, prefix: str) -> str:
+        return f"{prefix}_{next(self._ids)}"
+
+    async def handler(self, ws, path=None):
+        self.connections += 1
+        turn = 0
+        waiting_for_outputs = set()
+
+        async def send(event):
+            await ws.send(json.dumps(event))
+
+        await send({"type": "session.created", "session": {"id": self._id("sess")}})
+
+        async for message in ws:
+            event = json.loads(message)
+            event_type = event.get("type")
+
+            if event_type == "session.update":
+                await send({"type": "session.updated", "session": event.get("session", {})})
+
+            elif event_type == "input_audio_buffer.append":
+                self.audio_bytes_received += len(event.get("audio", "")) * 3 // 4
+
+            elif event_type == "input_audio_buffer.commit":
+                turn += 1
+                await send({"type": "input_audio_buffer.committed", "item_id": self._id("item")})
+                await send({
+                    "type": "conversation.item.input_audio_transcription.completed",
+                    "transcript": f"Benchmark turn {turn}, how's my week looking?"
+                })
+                if self.tool_every and self.tools and turn % self.tool_every == 0:
+                    waiting_for_outputs = await self._call_tools(send)
+                else:
+                    await self._speak(send, turn)
+
+            elif event_type == "conversation.item.create":
+                item = event.get("item", {})
+                await send({"type": "conversation.item.created", "item": {"id": self._id("item")}})
+                waiting_for_outputs.discard(item.get("call_id"))
+
+            elif event_type == "response.create":
+                if waiting_for_outputs:
+                    await send({
+                        "type": "error",
+                        "error": {"message": f"response.create before outputs for {sorted(waiting_for_outputs)}"}
+                    })
+                await self._speak(send, turn)
+
+    async def _call_tools(self, send) -> set:
+        response_id = self._id("resp")
+        await send({"type": "response.created", "response": {"id": response_id}})
+        call_ids = set()
+        for name in self.tools:
+            call_id = self._id("call")
+            call_ids.add(call_id)
+            await send({
+                "type": "response.function_call_arguments.done",
+                "response_id": response_id,
+                "call_id": call_id,
+                "name": name,
+                "arguments": "{}"
+            })
+        await send({"type": "response.done", "response": {"id": response_id, "status": "completed"}})
+        return call_ids
+
+    async def _speak(self, send, turn: int):
+        response_id = self._id("resp")
+        await send({"type": "response.created", "response": {"id": response_id}})
+        if self.first_delta_delay:
+            await asyncio.sleep(self.first_delta_delay)
+
+        words = []
+        for i in range(self.audio_chunks):
+            word = f"word{i} "
+            words.append(word)
+            await send({"type": "response.audio.delta", "response_id": response_id, "delta": self.audio_delta})
+            await send({"type": "response.audio_transcript.delta", "response_id": response_id, "delta": word})
+            if self.paced:
+                await asyncio.sleep(self.chunk_ms / 1000)
+
+        await send({"type": "response.audio.done", "response_id": response_id})
+        await send({
+            "type": "response.audio_transcript.done",
+            "response_id": response_id,
+            "transcript": f"Reply to turn {turn}: " + "".join(words).strip()
+        })
+        await send({"type": "response.done", "response": {"id": response_id, "status": "completed"}})
+
+    async def serve(self, host: str, port: int):
+        async with websockets.serve(self.handler, host, port, max_size=None):
+            await asyncio.Future()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI Realtime API server for local testing and benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--tools", default="get_weekly_summary,get_goals",
+                        help="Comma-separated tool calls to request on tool turns")
+    parser.add_argument("--tool-every", type=int, default=3, help="Request tool calls every N turns (0 disables)")
+    parser.add_argument("--audio-chunks", type=int, default=10, help="Audio deltas per spoken reply")
+    parser.add_argument("--chunk-ms", type=int, default=100, help="Audio per delta in milliseconds")
+    parser.add_argument("--first-delta-delay-ms", type=float, default=0.0, help="Simulated model latency")
+    parser.add_argument("--paced", action="store_true", help="Send audio deltas in real time instead of all at once")
+    args = parser.parse_args()
+
+    server = FakeRealtimeServer(
+        tools=[t for t in args.tools.split(",") if t],
+        tool_every=args.tool_every,
+        audio_chunks=args.audio_chunks,
+        chunk_ms=args.chunk_ms,
+        first_delta_delay_ms=args.first_delta_delay_ms,
+        paced=args.paced
+    )
+    print(f"Fake realtime server on ws://{args.host}:{args.port}")
+    asyncio.run(server.serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""End-to-end latency benchmark for the voice relay.
+
+Drives N concurrent simulated browser clients against /ws/chat/{user_id}
+and writes machine-readable JSON results. With --spawn it starts the
+fake realtime server and the relay itself, pointed at a throwaway
+SQLite database:
+
+    python bench/run_benchmark.py --spawn --clients 50 --turns 6 --output results.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+import websockets
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_RATE = 24000
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 3)
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "p50": pick(50),
+        "p90": pick(90),
+        "p95": pick(95),
+        "p99": pick(99),
+        "max": round(ordered[-1], 3)
+    }
+
+
+class ClientStats:
+    def __init__(self):
+        self.first_audio_ms = []
+        self.tool_turn_first_audio_ms = []
+        self.tool_to_audio_ms = []
+        self.turn_ms = []
+        self.audio_bytes_sent = 0
+        self.audio_bytes_received = 0
+        self.messages_received = 0
+        self.turns = 0
+        self.errors = []
+
+
+async def run_client(url: str, turns: int, audio_ms: int, frame_samples: int, paced: bool,
+                     turn_timeout: float, stats: ClientStats):
+    frame = b"\x00\x00" * frame_samples
+    frames_per_turn = max(1, SAMPLE_RATE * audio_ms // 1000 // frame_samples)
+    frame_interval = frame_samples / SAMPLE_RATE
+
+    async with websockets.connect(url, max_size=None) as ws:
+        for _ in range(turns):
+            # Speak: stream PCM16 frames the way useVoiceChat does
+            for _ in range(frames_per_turn):
+                await ws.send(frame)
+                stats.audio_bytes_sent += len(frame)
+                if paced:
+                    await asyncio.sleep(frame_interval)
+
+            committed_at = time.perf_counter()
+            await ws.send(json.dumps({"type": "commit_audio"}))
+
+            first_audio = None
+            tool_at = None
+            tool_audio = None
+            deadline = committed_at + turn_timeout
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError("turn timed out")
+                message = await asyncio.wait_for(ws.recv(), remaining)
+                now = time.perf_counter()
+                stats.messages_received += 1
+
+                if isinstance(message, bytes):
+                    stats.audio_bytes_received += len(message)
+                    if first_audio is None:
+                        first_audio = now
+                    if tool_at is not None and tool_audio is None:
+                        tool_audio = now
+                    continue
+
+                event = json.loads(message)
+                if event.get("type") == "function_call" and tool_at is None:
+                    tool_at = now
+                elif event.get("type") == "error":
+                    stats.errors.append(event.get("message"))
+                elif event.get("type") == "assistant_transcript":
+                    break
+
+            stats.turns += 1
+            stats.turn_ms.append((now - committed_at) * 1000)
+            if first_audio is not None:
+                stats.first_audio_ms.append((first_audio - committed_at) * 1000)
+            if tool_at is not None and tool_audio is not None:
+                stats.tool_turn_first_audio_ms.append((tool_audio - committed_at) * 1000)
+                stats.tool_to_audio_ms.append((tool_audio - tool_at) * 1000)
+
+
+async def run_benchmark(args) -> dict:
+    clients = [ClientStats() for _ in range(args.clients)]
+    base = args.url.rstrip("/")
+
+    async def client(i, stats):
+        # Stagger connects a little so the handshake burst doesn't dominate
+        await asyncio.sleep(i * args.ramp_ms / 1000)
+        try:
+            await run_client(
+                f"{base}/{args.user_id_base + i}", args.turns, args.audio_ms,
+                args.frame_samples, args.paced, args.turn_timeout, stats
+            )
+        except Exception as e:
+            stats.errors.append(f"{type(e).__name__}: {e}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i, s) for i, s in enumerate(clients)))
+    elapsed = time.perf_counter() - started
+
+    def merged(field):
+        return [v for s in clients for v in getattr(s, field)]
+
+    turns = sum(s.turns for s in clients)
+    errors = merged("errors")
+    return {
+        "benchmark": "relay_e2e",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": {
+            "url": args.url,
+            "clients": args.clients,
+            "turns": args.turns,
+            "audio_ms": args.audio_ms,
+            "frame_samples": args.frame_samples,
+            "paced": args.paced,
+            "spawned": args.spawn
+        },
+        "results": {
+            "elapsed_s": round(elapsed, 3),
+            "turns_completed": turns,
+            "turns_expected": args.clients * args.turns,
+            "errors": len(errors),
+            "error_samples": errors[:5],
+            "first_audio_ms": percentiles(merged("first_audio_ms")),
+            "tool_turn_first_audio_ms": percentiles(merged("tool_turn_first_audio_ms")),
+            "tool_to_audio_ms": percentiles(merged("tool_to_audio_ms")),
+            "turn_ms": percentiles(merged("turn_ms")),
+            "throughput": {
+                "turns_per_s": round(turns / elapsed, 3) if elapsed else 0.0,
+                "messages_per_s": round(sum(s.messages_received for s in clients) / elapsed, 3) if elapsed else 0.0,
+                "audio_in_bytes_per_s": round(sum(s.audio_bytes_sent for s in clients) / elapsed, 1) if elapsed else 0.0,
+                "audio_out_bytes_per_s": round(sum(s.audio_bytes_received for s in clients) / elapsed, 1) if elapsed else 0.0
+            }
+        }
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+def spawn_stack(args) -> list:
+    """Start the fake realtime server and the relay; returns the processes to stop."""
+    fake_port = _free_port()
+    relay_port = _free_port()
+    db_path = os.path.join(tempfile.mkdtemp(prefix="stride-bench-"), "bench.db")
+
+    fake = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "bench", "fake_realtime.py"),
+         "--port", str(fake_port), "--tool-every", str(args.tool_every),
+         "--audio-chunks", str(args.audio_chunks)],
+        stdout=subprocess.DEVNULL
+    )
+    env = {
+        **os.environ,
+        "OPENAI_REALTIME_URL": f"ws://127.0.0.1:{fake_port}",
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "bench"),
+        "DATABASE_URL": f"sqlite:///{db_path}"
+    }
+    relay = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(relay_port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+        # Keep the relay's prints out of the JSON on stdout
+        stdout=sys.stderr
+    )
+    processes = [relay, fake]
+    try:
+        _wait_for_port(fake_port)
+        _wait_for_port(relay_port)
+    except Exception:
+        for process in processes:
+            process.terminate()
+        raise
+    args.url = f"ws://127.0.0.1:{relay_port}/ws/chat"
+    return processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the voice relay with concurrent simulated clients.")
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/ws/chat", help="Relay WebSocket base URL (user id is appended)")
+    parser.add_argument("--spawn", action="store_true", help="Start the fake realtime server and relay locally")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--audio-ms", type=int, default=1000, help="Audio streamed per user turn")
+    parser.add_argument("--frame-samples", type=int, default=4096, help="Samples per client audio frame")
+    parser.add_argument("--paced", action="store_true", help="Stream audio in real time")
+    parser.add_argument("--ramp-ms", type=float, default=10.0, help="Delay between client connects")
+    parser.add_argument("--turn-timeout", type=float, default=30.0)
+    parser.add_argument("--user-id-base", type=int, default=1000)
+    parser.add_argument("--tool-every", type=int, default=3, help="(--spawn) tool-call turn frequency")
+    parser.add_argument("--audio-chunks", type=int, default=10, help="(--spawn) audio deltas per reply")
+    parser.add_argument("--output", help="Write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    processes = spawn_stack(args) if args.spawn else []
+    try:
+        results = asyncio.run(run_benchmark(args))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import os
+import functools
+from datetime import date
+from collections import OrderedDict
+
+CONTEXT_CACHE_USERS = int(os.getenv("CONTEXT_CACHE_USERS", "2000"))
+
+
+class ContextCache:
+    """Process-wide cache of read-only tool results, per user with LRU eviction.
+
+    Each entry records what it was derived from ("runs", "goals"), and
+    writers invalidate only the entries that depend on what they changed.
+    A per-user version number stops a read that raced a write from
+    storing a result computed before that write committed.
+    """
+
+    def __init__(self, max_users: int = CONTEXT_CACHE_USERS):
+        self.max_users = max_users
+        self._users = OrderedDict()
+        self._versions = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def version(self, user_id: int) -> int:
+        return self._versions.get(user_id, 0)
+
+    def get(self, user_id: int, key: tuple):
+        entries = self._users.get(user_id)
+        if entries is not None and key in entries:
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            return entries[key][1]
+        self.misses += 1
+        return None
+
+    def set(self, user_id: int, key: tuple, depends: tuple, value, version: int):
+        if self.version(user_id) != version:
+            return
+        entries = self._users.setdefault(user_id, {})
+        entries[key] = (depends, value)
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            evicted, _ = self._users.popitem(last=False)
+            self._versions.pop(evicted, None)
+
+    def invalidate(self, user_id: int, *kinds: str):
+        """Drop this user's entries that depend on any of `kinds`."""
+        self._versions[user_id] = self.version(user_id) + 1
+        self.invalidations += 1
+        entries = self._users.get(user_id)
+        if entries:
+            for key in [k for k, (depends, _) in entries.items() if set(depends) & set(kinds)]:
+                del entries[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._users),
+            "entries": sum(len(e) for e in self._users.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations
+        }
+
+
+# Shared by every session in this process
+context_cache = ContextCache()
+
+
+def cached(*depends: str):
+    """Cache an async `(db, user_id, ...)` tool's result until `depends` change.
+
+    Results are keyed on the arguments and today's date, since the
+    summaries are relative to today. Returned dicts are shared between
+    callers and must not be mutated.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(db, user_id, *args, **kwargs):
+            key = (func.__name__, args, tuple(sorted(kwargs.items())), date.today())
+            result = context_cache.get(user_id, key)
+            if result is None:
+                version = context_cache.version(user_id)
+                result = await func(db, user_id, *args, **kwargs)
+                context_cache.set(user_id, key, depends, result, version)
+            return result
+        return wrapper
+    return decorator
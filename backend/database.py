@@ -1,21 +1,53 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, Text, DateTime, Date, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, Date, ForeignKey, Index, LargeBinary, event, inspect
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import relationship
 from datetime import datetime, date
 import os
+import asyncio
+import argparse
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./stride_coach.db")
 
+
+def _async_url(url: str) -> str:
+    """Map a plain database URL onto its asyncio driver."""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+
+def dialect_insert(model):
+    """INSERT for the configured database, so on_conflict_do_update/do_nothing are available."""
+    return (sqlite_insert if IS_SQLITE else pg_insert)(model)
+
 # Handle SQLite vs PostgreSQL
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+if IS_SQLITE:
+    engine = create_async_engine(_async_url(DATABASE_URL))
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers run while a commit is in flight
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
 else:
-    engine = create_engine(DATABASE_URL)
+    engine = create_async_engine(_async_url(DATABASE_URL), pool_size=20, max_overflow=20)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
 Base = declarative_base()
 
 
@@ -45,6 +77,9 @@ class Conversation(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_conversation_created", "conversation_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     conversation_id = Column(Integer, ForeignKey("conversations.id"))
@@ -55,14 +90,27 @@ class Message(Base):
     conversation = relationship("Conversation", back_populates="messages")
 
 
+class MessageEmbedding(Base):
+    __tablename__ = "message_embeddings"
+    
+    # float16 vector from memory.embed(), user_id copied from the conversation
+    message_id = Column(Integer, ForeignKey("messages.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    vector = Column(LargeBinary)
+
+
 class Run(Base):
     __tablename__ = "runs"
+    __table_args__ = (
+        Index("ix_runs_user_date", "user_id", "run_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     distance_miles = Column(Float)
     duration_minutes = Column(Integer)
     pace_per_mile = Column(String(10))
+    pace_seconds = Column(Float, nullable=True)  # seconds per mile, for sorting and aggregating
     notes = Column(Text, nullable=True)
     run_date = Column(Date, default=date.today)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -72,6 +120,9 @@ class Run(Base):
 
 class Goal(Base):
     __tablename__ = "goals"
+    __table_args__ = (
+        Index("ix_goals_user_race_date", "user_id", "race_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -84,15 +135,176 @@ class Goal(Base):
     user = relationship("User", back_populates="goals")
 
 
-def init_db():
+class MileageRollup(Base):
+    __tablename__ = "mileage_rollups"
+    
+    # period is 'day' or 'week'; weeks are keyed by their ISO Monday
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    period = Column(String(5), primary_key=True)
+    period_start = Column(Date, primary_key=True)
+    miles = Column(Float, default=0.0)
+    minutes = Column(Integer, default=0)
+    num_runs = Column(Integer, default=0)
+
+
+class TrainingLoad(Base):
+    __tablename__ = "training_loads"
+    
+    # Acute/chronic load as of the end of `as_of`; see training_load.py
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    as_of = Column(Date)
+    atl = Column(Float, default=0.0)
+    ctl = Column(Float, default=0.0)
+
+
+class FitnessEstimate(Base):
+    __tablename__ = "fitness_estimates"
+    
+    # Best recent effort by VDOT; see race_prediction.py
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    vdot = Column(Float)
+    run_date = Column(Date)
+    distance_miles = Column(Float)
+    duration_minutes = Column(Float)
+
+
+class PersonalRecord(Base):
+    __tablename__ = "personal_records"
+    
+    # kind is 'fastest' (lowest pace) or 'longest' for each distance bucket; see personal_records.py
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    bucket = Column(String(20), primary_key=True)
+    kind = Column(String(10), primary_key=True)
+    run_date = Column(Date)
+    distance_miles = Column(Float)
+    duration_minutes = Column(Integer)
+    pace_seconds = Column(Float)
+
+
+def _create_missing_indexes(conn):
+    """create_all skips tables that already exist, so add any new indexes to them"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+# Columns added after a table was first created: (table, column DDL, backfill)
+COLUMN_MIGRATIONS = [
+    (
+        "runs", "pace_seconds FLOAT",
+        "UPDATE runs SET pace_seconds = duration_minutes * 60.0 / distance_miles WHERE distance_miles > 0"
+    ),
+]
+
+
+def _add_missing_columns(conn):
+    """create_all won't alter existing tables either, so add and backfill new columns"""
+    inspector = inspect(conn)
+    for table, ddl, backfill in COLUMN_MIGRATIONS:
+        existing = {c["name"] for c in inspector.get_columns(table)}
+        if ddl.split()[0] not in existing:
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {ddl}")
+            conn.exec_driver_sql(backfill)
+
+
+# Set by init_db once the full-text index on messages.content is in place
+FULL_TEXT_SEARCH = False
+
+SQLITE_FTS_DDL = [
+    # External-content FTS5 table: the text lives in messages, FTS keeps only the index
+    """CREATE VIRTUAL TABLE messages_fts USING fts5(
+        content, content='messages', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+]
+
+POSTGRES_FTS_DDL = [
+    """ALTER TABLE messages ADD COLUMN IF NOT EXISTS content_tsv tsvector
+        GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_messages_content_tsv ON messages USING GIN (content_tsv)",
+]
+
+
+def _create_search_index(conn) -> bool:
+    """Set up full-text search over message content, backfilling existing rows."""
+    if not IS_SQLITE:
+        for ddl in POSTGRES_FTS_DDL:
+            conn.exec_driver_sql(ddl)
+        return True
+
+    exists = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+    ).first()
+    if not exists:
+        try:
+            conn.exec_driver_sql(SQLITE_FTS_DDL[0])
+        except Exception as e:
+            print(f"SQLite FTS5 unavailable, falling back to LIKE search: {e}")
+            return False
+        conn.exec_driver_sql("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+    for ddl in SQLITE_FTS_DDL[1:]:
+        conn.exec_driver_sql(ddl)
+    return True
+
+
+def _missing_tables(conn) -> set:
+    return set(Base.metadata.tables) - set(inspect(conn).get_table_names())
+
+
+async def _backfill(new_tables: set):
+    """Fill derived tables that were just added to a database that already has runs"""
+    if "runs" in new_tables:
+        return
+    # Imported here: these modules import this one
+    import rollups
+    import personal_records
+
+    async with SessionLocal() as db:
+        if "mileage_rollups" in new_tables:
+            count = await rollups.rebuild(db)
+            print(f"Backfilled {count} mileage rollup rows")
+        if "personal_records" in new_tables:
+            count = await personal_records.rebuild(db)
+            print(f"Backfilled {count} personal record rows")
+
+
+async def init_db():
     """Create all tables"""
-    Base.metadata.create_all(bind=engine)
+    global FULL_TEXT_SEARCH
+    async with engine.begin() as conn:
+        new_tables = await conn.run_sync(_missing_tables)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_create_missing_indexes)
+        FULL_TEXT_SEARCH = await conn.run_sync(_create_search_index)
+    await _backfill(new_tables)
+
+
+def rebuild_main(rebuild, description: str, done: str):
+    """Command line for a derived table's `rebuild(db, user_id)`; `done` is formatted with the count."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--user-id", type=int, default=None, help="Only rebuild this user's rows")
+    args = parser.parse_args()
+
+    async def main():
+        await init_db()
+        async with SessionLocal() as db:
+            count = await rebuild(db, args.user_id)
+        print(done.format(count=count))
+
+    asyncio.run(main())
 
 
-def get_db():
+async def get_db():
     """Get database session"""
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
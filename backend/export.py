@@ -0,0 +1,76 @@
+import io
+import csv
+import zlib
+from datetime import date, datetime
+from sqlalchemy import select
+
+from database import SessionLocal, Run, Goal, Message, Conversation
+from relay_codec import dumps
+
+# Rows fetched per round trip; memory stays at one batch however long the history is
+EXPORT_BATCH_SIZE = 1000
+
+EXPORTS = {
+    "runs": (
+        Run.id, Run.run_date, Run.distance_miles, Run.duration_minutes, Run.pace_per_mile,
+        Run.pace_seconds, Run.notes, Run.created_at
+    ),
+    "goals": (
+        Goal.id, Goal.race_name, Goal.race_date, Goal.distance_miles, Goal.target_time, Goal.created_at
+    ),
+    "messages": (
+        Message.id, Message.conversation_id, Message.role, Message.content, Message.created_at
+    ),
+}
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _query(kind: str, user_id: int):
+    columns = EXPORTS[kind]
+    if kind == "messages":
+        return select(*columns).join(Conversation).where(
+            Conversation.user_id == user_id
+        ).order_by(Message.conversation_id, Message.created_at, Message.id)
+    model = columns[0].class_
+    return select(*columns).where(model.user_id == user_id).order_by(model.id)
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def _encode_ndjson(keys, rows) -> bytes:
+    return "".join(dumps(dict(zip(keys, map(_plain, row)))) + "\n" for row in rows).encode()
+
+
+def _encode_csv(rows) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([_plain(v) for v in row] for row in rows)
+    return buffer.getvalue().encode()
+
+
+async def _encoded(kind: str, user_id: int, fmt: str):
+    keys = [c.key for c in EXPORTS[kind]]
+    if fmt == "csv":
+        yield _encode_csv([keys])
+
+    async with SessionLocal() as db:
+        # Server-side cursor on Postgres; batched fetches on SQLite
+        result = await db.stream(_query(kind, user_id).execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield _encode_ndjson(keys, rows) if fmt == "ndjson" else _encode_csv(rows)
+
+
+async def stream_export(kind: str, user_id: int, fmt: str = "ndjson", compress: bool = False):
+    """Byte chunks of a user's full `kind` history, optionally gzipped on the fly."""
+    if not compress:
+        async for chunk in _encoded(kind, user_id, fmt):
+            yield chunk
+        return
+
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in _encoded(kind, user_id, fmt):
+        compressed = gzip.compress(chunk)
+        if compressed:
+            yield compressed
+    yield gzip.flush()
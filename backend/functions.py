@@ -1,12 +1,51 @@
-import httpx
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+import re
+import time
+import asyncio
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, desc, func, text, table, column, literal_column
 from datetime import datetime, date, timedelta
-from database import Run, Goal, Message, Conversation
+from database import IS_SQLITE, Run, Goal, Message, Conversation
+import database
+import memory
+import rollups
+import training_load
+import race_prediction
+import personal_records
+from context_cache import cached, context_cache
+from metrics import function_seconds, function_errors
+from training_events import training_events
+from weather import weather_service
+
+# FTS5 index over messages.content, maintained by triggers (see database.py)
+MESSAGES_FTS = table("messages_fts", column("rowid"))
+
+
+def _format_pace(pace_decimal: float) -> str:
+    """Format minutes-per-mile as M:SS."""
+    pace_minutes = int(pace_decimal)
+    pace_seconds = int((pace_decimal - pace_minutes) * 60)
+    return f"{pace_minutes}:{pace_seconds:02d}"
+
+
+async def _run_rows(db: AsyncSession, user_id: int, start_date: date):
+    """Only the columns the summaries report, newest first."""
+    result = await db.execute(
+        select(
+            Run.run_date,
+            Run.distance_miles,
+            Run.duration_minutes,
+            Run.pace_per_mile,
+            Run.notes
+        ).where(
+            Run.user_id == user_id,
+            Run.run_date >= start_date
+        ).order_by(desc(Run.run_date))
+    )
+    return result.all()
 
 
 async def log_run(
-    db: Session,
+    db: AsyncSession,
     user_id: int,
     distance_miles: float,
     duration_minutes: int,
@@ -16,13 +55,8 @@ async def log_run(
     """Log a completed run to the training log."""
     
     # Calculate pace
-    if distance_miles > 0:
-        pace_decimal = duration_minutes / distance_miles
-        pace_minutes = int(pace_decimal)
-        pace_seconds = int((pace_decimal - pace_minutes) * 60)
-        pace_formatted = f"{pace_minutes}:{pace_seconds:02d}"
-    else:
-        pace_formatted = "N/A"
+    pace_seconds = personal_records.pace_seconds(distance_miles, duration_minutes)
+    pace_formatted = _format_pace(pace_seconds / 60) if pace_seconds is not None else "N/A"
     
     # Parse date
     if run_date:
@@ -39,12 +73,21 @@ async def log_run(
         distance_miles=distance_miles,
         duration_minutes=duration_minutes,
         pace_per_mile=pace_formatted,
+        pace_seconds=pace_seconds,
         notes=notes,
         run_date=parsed_date
     )
     
-    db.add(run)
-    db.commit()
+    async with training_load.user_lock(user_id):
+        # Before the run is added, so a first-time state computed from history doesn't count it twice
+        await training_load.add_run(db, user_id, parsed_date, duration_minutes)
+        db.add(run)
+        await rollups.add_run(db, user_id, parsed_date, distance_miles, duration_minutes)
+        await race_prediction.add_run(db, user_id, parsed_date, distance_miles, duration_minutes)
+        await personal_records.add_run(db, user_id, parsed_date, distance_miles, duration_minutes)
+        await db.commit()
+    context_cache.invalidate(user_id, "runs")
+    training_events.run_logged(run)
     
     return {
         "success": True,
@@ -54,17 +97,15 @@ async def log_run(
     }
 
 
-async def get_weekly_summary(db: Session, user_id: int) -> dict:
+@cached("runs")
+async def get_weekly_summary(db: AsyncSession, user_id: int) -> dict:
     """Get summary of runs from the past 7 days."""
     
     week_ago = date.today() - timedelta(days=7)
     
-    runs = db.query(Run).filter(
-        Run.user_id == user_id,
-        Run.run_date >= week_ago
-    ).order_by(desc(Run.run_date)).all()
+    num_runs, total_miles, total_minutes = await rollups.get_totals(db, user_id, week_ago)
     
-    if not runs:
+    if not num_runs:
         return {
             "total_miles": 0,
             "total_minutes": 0,
@@ -72,8 +113,7 @@ async def get_weekly_summary(db: Session, user_id: int) -> dict:
             "message": "No runs logged in the past 7 days."
         }
     
-    total_miles = sum(r.distance_miles for r in runs)
-    total_minutes = sum(r.duration_minutes for r in runs)
+    runs = await _run_rows(db, user_id, week_ago)
     
     runs_data = [
         {
@@ -89,30 +129,28 @@ async def get_weekly_summary(db: Session, user_id: int) -> dict:
     return {
         "total_miles": round(total_miles, 1),
         "total_minutes": total_minutes,
-        "num_runs": len(runs),
-        "average_pace": f"{int(total_minutes/total_miles)}:{int((total_minutes/total_miles % 1) * 60):02d}" if total_miles > 0 else "N/A",
+        "num_runs": num_runs,
+        "average_pace": _format_pace(total_minutes / total_miles) if total_miles > 0 else "N/A",
         "runs": runs_data
     }
 
 
-async def get_running_history(db: Session, user_id: int, days: int = 14) -> dict:
+@cached("runs")
+async def get_running_history(db: AsyncSession, user_id: int, days: int = 14) -> dict:
     """Get recent runs to understand training patterns."""
     
     start_date = date.today() - timedelta(days=days)
     
-    runs = db.query(Run).filter(
-        Run.user_id == user_id,
-        Run.run_date >= start_date
-    ).order_by(desc(Run.run_date)).all()
+    num_runs, total_miles, _ = await rollups.get_totals(db, user_id, start_date)
     
-    if not runs:
+    if not num_runs:
         return {
             "total_miles": 0,
             "num_runs": 0,
             "message": f"No runs logged in the past {days} days."
         }
     
-    total_miles = sum(r.distance_miles for r in runs)
+    runs = await _run_rows(db, user_id, start_date)
     
     runs_data = [
         {
@@ -128,7 +166,7 @@ async def get_running_history(db: Session, user_id: int, days: int = 14) -> dict
     return {
         "period_days": days,
         "total_miles": round(total_miles, 1),
-        "num_runs": len(runs),
+        "num_runs": num_runs,
         "avg_miles_per_week": round(total_miles / (days / 7), 1),
         "runs": runs_data
     }
@@ -138,22 +176,8 @@ async def get_weather(location: str = "San Diego") -> dict:
     """Get current weather for run planning."""
     
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                f"https://wttr.in/{location}?format=j1"
-            )
-            response.raise_for_status()
-            data = response.json()
-            current = data["current_condition"][0]
-            
-            return {
-                "location": location,
-                "temp_f": current["temp_F"],
-                "feels_like_f": current["FeelsLikeF"],
-                "humidity": current["humidity"],
-                "conditions": current["weatherDesc"][0]["value"],
-                "wind_mph": current["windspeedMiles"]
-            }
+        conditions = await weather_service.get(location)
+        return {"location": location, **conditions}
     except Exception as e:
         return {
             "error": f"Could not fetch weather: {str(e)}",
@@ -162,7 +186,7 @@ async def get_weather(location: str = "San Diego") -> dict:
 
 
 async def set_goal(
-    db: Session,
+    db: AsyncSession,
     user_id: int,
     race_name: str,
     race_date: str,
@@ -185,7 +209,9 @@ async def set_goal(
     )
     
     db.add(goal)
-    db.commit()
+    await db.commit()
+    context_cache.invalidate(user_id, "goals")
+    training_events.goal_set(goal)
     
     days_until = (parsed_date - date.today()).days
     
@@ -198,13 +224,17 @@ async def set_goal(
     }
 
 
-async def get_goals(db: Session, user_id: int) -> dict:
+@cached("goals")
+async def get_goals(db: AsyncSession, user_id: int) -> dict:
     """Get user's current race goals."""
     
-    goals = db.query(Goal).filter(
-        Goal.user_id == user_id,
-        Goal.race_date >= date.today()
-    ).order_by(Goal.race_date).all()
+    result = await db.execute(
+        select(Goal).where(
+            Goal.user_id == user_id,
+            Goal.race_date >= date.today()
+        ).order_by(Goal.race_date)
+    )
+    goals = result.scalars().all()
     
     if not goals:
         return {"message": "No upcoming race goals set.", "goals": []}
@@ -223,30 +253,32 @@ async def get_goals(db: Session, user_id: int) -> dict:
     return {"goals": goals_data}
 
 
+@cached("runs", "goals")
 async def suggest_workout(
-    db: Session,
+    db: AsyncSession,
     user_id: int,
     workout_type: str = None
 ) -> dict:
     """Suggest a workout based on goals and recent training."""
     
-    # Get recent training context
-    summary = await get_weekly_summary(db, user_id)
+    # Get recent training context (totals only, no need for the run list)
+    num_runs, weekly_miles, _ = await rollups.get_totals(db, user_id, date.today() - timedelta(days=7))
+    weekly_miles = round(weekly_miles, 1)
     goals_data = await get_goals(db, user_id)
+    load = await training_load.get_state(db, user_id)
     
-    weekly_miles = summary.get("total_miles", 0)
-    num_runs = summary.get("num_runs", 0)
-    
-    # Auto-suggest workout type if not specified
+    # Auto-suggest workout type from training-stress balance if not specified
     if not workout_type:
-        if num_runs == 0:
+        if num_runs == 0 or load["ctl"] < 10:
             workout_type = "easy"
-        elif weekly_miles > 30:
+        elif load["tsb"] < -25 or (load["ramp_ratio"] or 0) > 1.5:
             workout_type = "recovery"
-        elif num_runs < 3:
+        elif load["tsb"] < -10:
             workout_type = "easy"
+        elif load["tsb"] > 5:
+            workout_type = "long_run" if date.today().weekday() >= 5 else "tempo"
         else:
-            workout_type = "easy"  # Default to easy
+            workout_type = "easy"
     
     suggestions = {
         "easy": {
@@ -283,6 +315,7 @@ async def suggest_workout(
     
     workout = suggestions.get(workout_type, suggestions["easy"])
     workout["weekly_context"] = f"{weekly_miles} miles across {num_runs} runs this week"
+    workout["training_load"] = f"Fitness {load['ctl']}, fatigue {load['atl']}, form {load['tsb']} ({load['status']})"
     
     if goals_data.get("goals"):
         next_goal = goals_data["goals"][0]
@@ -291,24 +324,129 @@ async def suggest_workout(
     return workout
 
 
-async def get_past_context(db: Session, user_id: int, query: str) -> dict:
-    """Search past conversations for relevant context."""
+@cached("runs")
+async def get_training_load(db: AsyncSession, user_id: int) -> dict:
+    """Get acute/chronic training load and training-stress balance."""
+    
+    load = await training_load.get_state(db, user_id)
+    return {
+        **load,
+        "message": (
+            f"Fitness (42-day load) {load['ctl']} min/day, fatigue (7-day load) {load['atl']} min/day, "
+            f"form {load['tsb']}: {load['status']}"
+        )
+    }
+
+
+@cached("runs", "goals")
+async def predict_race_time(db: AsyncSession, user_id: int, distance_miles: float = None) -> dict:
+    """Predict race times from the user's best recent effort."""
+    
+    estimate = await race_prediction.get_estimate(db, user_id)
+    if estimate["vdot"] is None:
+        return {
+            "message": f"No runs of a mile or more in the past {race_prediction.PREDICTION_WINDOW_DAYS} days to predict from."
+        }
     
-    # Get user's conversations
-    conversations = db.query(Conversation).filter(
-        Conversation.user_id == user_id
-    ).all()
+    score = estimate["vdot"]
+    effort = race_prediction.format_time(estimate["duration_minutes"])
+    result = {
+        "fitness_score": round(score, 1),
+        "based_on": f"{estimate['distance_miles']} miles in {effort} on {estimate['run_date'].strftime('%B %d')}",
+        "predictions": race_prediction.predictions(score)
+    }
+    if distance_miles:
+        result["predicted_time"] = race_prediction.format_time(race_prediction.predict_minutes(score, distance_miles))
     
-    if not conversations:
-        return {"message": "No past conversations found.", "results": []}
+    goals_data = await get_goals(db, user_id)
+    goal_predictions = []
+    for g in goals_data.get("goals", []):
+        if not g["distance_miles"]:
+            continue
+        predicted = race_prediction.predict_minutes(score, g["distance_miles"])
+        goal = {"race_name": g["race_name"], "predicted_time": race_prediction.format_time(predicted)}
+        target = race_prediction.parse_race_time(g["target_time"], g["distance_miles"])
+        if target:
+            goal["target_time"] = g["target_time"]
+            goal["on_track"] = predicted <= target
+            goal["gap"] = race_prediction.format_time(abs(predicted - target))
+        goal_predictions.append(goal)
+    if goal_predictions:
+        result["goals"] = goal_predictions
+    
+    return result
+
+
+@cached("runs")
+async def get_personal_records(db: AsyncSession, user_id: int, distance_miles: float = None) -> dict:
+    """Get the fastest and longest run in each distance bucket."""
     
-    conv_ids = [c.id for c in conversations]
+    records = await personal_records.get_records(db, user_id, distance_miles)
+    if not records:
+        return {"message": "No personal records yet - they start with runs of a mile or more.", "records": []}
     
-    # Simple keyword search in messages
-    messages = db.query(Message).filter(
-        Message.conversation_id.in_(conv_ids),
-        Message.content.ilike(f"%{query}%")
-    ).order_by(desc(Message.created_at)).limit(5).all()
+    records_data = [
+        {
+            "distance_bucket": r.bucket,
+            "record": r.kind,
+            "date": r.run_date.strftime("%Y-%m-%d"),
+            "distance": r.distance_miles,
+            "duration": r.duration_minutes,
+            "pace": _format_pace(r.pace_seconds / 60)
+        }
+        for r in records
+    ]
+    
+    return {"records": records_data}
+
+
+async def get_past_context(db: AsyncSession, user_id: int, query: str) -> dict:
+    """Search past conversations for relevant context."""
+    
+    terms = re.findall(r"\w+", query.lower())
+    columns = select(Message.id, Message.content, Message.role, Message.created_at).join(
+        Conversation, Conversation.id == Message.conversation_id
+    ).where(Conversation.user_id == user_id)
+    
+    if not terms:
+        messages = []
+    elif not database.FULL_TEXT_SEARCH:
+        # No FTS5 in this SQLite build: plain substring match
+        result = await db.execute(
+            columns.where(Message.content.ilike(f"%{query}%"))
+            .order_by(desc(Message.created_at)).limit(5)
+        )
+        messages = result.all()
+    elif IS_SQLITE:
+        # Any term may match; BM25 puts messages hitting more of them first
+        match = " OR ".join(f'"{t}"' for t in terms)
+        result = await db.execute(
+            columns.join(MESSAGES_FTS, MESSAGES_FTS.c.rowid == Message.id)
+            .where(text("messages_fts MATCH :match").bindparams(match=match))
+            .order_by(text("bm25(messages_fts)")).limit(5)
+        )
+        messages = result.all()
+    else:
+        tsquery = func.to_tsquery("english", " | ".join(terms))
+        tsv = literal_column("messages.content_tsv")
+        result = await db.execute(
+            columns.where(tsv.op("@@")(tsquery))
+            .order_by(desc(func.ts_rank_cd(tsv, tsquery))).limit(5)
+        )
+        messages = result.all()
+    
+    # Fill remaining slots with paraphrases the keyword index can't see
+    if memory.SEMANTIC_MEMORY and len(messages) < 5:
+        seen = {m.id for m in messages}
+        hits = [
+            message_id
+            for message_id, _ in await memory.memory_index.search(user_id, query, k=10)
+            if message_id not in seen
+        ][:5 - len(messages)]
+        if hits:
+            result = await db.execute(columns.where(Message.id.in_(hits)))
+            by_id = {m.id: m for m in result.all()}
+            messages = list(messages) + [by_id[i] for i in hits if i in by_id]
     
     if not messages:
         return {"message": f"No mentions of '{query}' found in past conversations.", "results": []}
@@ -329,6 +467,13 @@ async def get_past_context(db: Session, user_id: int, query: str) -> dict:
     }
 
 
+# Seconds before a tool call gives up so the coach isn't left silent
+DEFAULT_FUNCTION_TIMEOUT = 5.0
+FUNCTION_TIMEOUTS = {
+    "get_weather": 8.0,
+    "get_past_context": 3.0,
+}
+
 # Function dispatcher
 FUNCTION_MAP = {
     "log_run": log_run,
@@ -339,10 +484,13 @@ FUNCTION_MAP = {
     "get_goals": get_goals,
     "suggest_workout": suggest_workout,
     "get_past_context": get_past_context,
+    "get_training_load": get_training_load,
+    "predict_race_time": predict_race_time,
+    "get_personal_records": get_personal_records,
 }
 
 
-async def execute_function(db: Session, user_id: int, function_name: str, arguments: dict) -> dict:
+async def execute_function(db: AsyncSession, user_id: int, function_name: str, arguments: dict) -> dict:
     """Execute a function by name with given arguments."""
     
     func = FUNCTION_MAP.get(function_name)
@@ -351,12 +499,22 @@ async def execute_function(db: Session, user_id: int, function_name: str, argume
     
     # Functions that need db and user_id
     db_functions = ["log_run", "get_weekly_summary", "get_running_history", 
-                    "set_goal", "get_goals", "suggest_workout", "get_past_context"]
+                    "set_goal", "get_goals", "suggest_workout", "get_past_context",
+                    "get_training_load", "predict_race_time", "get_personal_records"]
+    
+    timeout = FUNCTION_TIMEOUTS.get(function_name, DEFAULT_FUNCTION_TIMEOUT)
+    start = time.perf_counter()
     
     try:
         if function_name in db_functions:
-            return await func(db, user_id, **arguments)
+            return await asyncio.wait_for(func(db, user_id, **arguments), timeout)
         else:
-            return await func(**arguments)
+            return await asyncio.wait_for(func(**arguments), timeout)
+    except asyncio.TimeoutError:
+        function_errors.inc(function_name)
+        return {"error": f"{function_name} timed out after {timeout:g} seconds"}
     except Exception as e:
-        return {"error": f"Error executing {function_name}: {str(e)}"}
\ No newline at end of file
+        function_errors.inc(function_name)
+        return {"error": f"Error executing {function_name}: {str(e)}"}
+    finally:
+        function_seconds.observe(time.perf_counter() - start, function_name)
@@ -1,38 +1,66 @@
 import os
 import json
 import base64
+import time
 import asyncio
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException
+from datetime import date, datetime
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from contextlib import asynccontextmanager
-import websockets
+from sqlalchemy import select, func, or_, and_
 from dotenv import load_dotenv
 
-from database import init_db, get_db, SessionLocal, User, Conversation, Message
-from functions import execute_function
-from prompts import SYSTEM_PROMPT, TOOLS
+from database import init_db, engine, SessionLocal, User, Conversation, Message, Run, Goal
+from functions import execute_function, predict_race_time, get_personal_records
+from runner_context import build_runner_context
+from transcript_writer import transcript_writer
+from context_cache import context_cache
+from training_events import training_events, goal_to_dict
+from export import EXPORTS, FORMATS, stream_export
+import run_import
+import training_load
+from pagination import MAX_PAGE_SIZE, encode_cursor, decode_cursor, parse_fields, row_to_dict, page_response
+from weather import weather_service
+from metrics import metrics, instrument_engine, first_audio_seconds
+from prompts import SYSTEM_PROMPT, SESSION_CONFIG
+from realtime_pool import realtime_pool
+from relay_codec import (
+    dumps, loads, audio_append_event, peek_audio_delta, AudioCoalescer, VoiceGate, RELAY_VAD_GATE
+)
+from relay_queue import (
+    Outbox, relay_stats, RELAY_CLIENT_AUDIO_BUFFER_BYTES, RELAY_UPSTREAM_AUDIO_BUFFER_BYTES
+)
 
 load_dotenv()
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-OPENAI_REALTIME_URL = "wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2025-06-03"
+instrument_engine(engine)
+metrics.register_stats("relay", relay_stats.stats, label="direction")
+metrics.register_stats("context_cache", context_cache.stats)
+metrics.register_stats("realtime_pool", realtime_pool.stats)
+metrics.register_stats("transcripts", transcript_writer.stats)
+metrics.register_stats("weather", weather_service.stats)
+metrics.register_stats("events", training_events.stats)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize database on startup."""
-    init_db()
+    await init_db()
     # Create a default user if none exists
-    db = SessionLocal()
-    try:
-        user = db.query(User).first()
+    async with SessionLocal() as db:
+        user = (await db.execute(select(User).limit(1))).scalar_one_or_none()
         if not user:
             user = User(name="Runner")
             db.add(user)
-            db.commit()
-    finally:
-        db.close()
+            await db.commit()
+    transcript_writer.start()
+    realtime_pool.start()
     yield
+    await realtime_pool.stop()
+    await transcript_writer.stop()
+    await weather_service.close()
+    await engine.dispose()
 
 
 app = FastAPI(title="Stride - Voice Running Coach", lifespan=lifespan)
@@ -44,6 +72,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 
@@ -54,205 +83,328 @@ async def root():
     return {"message": "Stride - Voice Running Coach API", "status": "running"}
 
 
+@app.get("/api/stats/transcripts")
+async def get_transcript_stats():
+    return transcript_writer.stats()
+
+
+@app.get("/api/stats/weather")
+async def get_weather_stats():
+    return weather_service.stats()
+
+
+@app.get("/api/stats/context")
+async def get_context_stats():
+    return context_cache.stats()
+
+
+@app.get("/api/stats/realtime")
+async def get_realtime_stats():
+    return realtime_pool.stats()
+
+
+@app.get("/api/stats/relay")
+async def get_relay_stats():
+    return relay_stats.stats()
+
+
+@app.get("/api/stats/events")
+async def get_event_stats():
+    return training_events.stats()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/api/users/{user_id}")
 async def get_user(user_id: int):
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter(User.id == user_id).first()
+    async with SessionLocal() as db:
+        user = await db.get(User, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         return {"id": user.id, "name": user.name}
-    finally:
-        db.close()
 
 
 @app.get("/api/users/{user_id}/conversations")
-async def get_conversations(user_id: int):
-    db = SessionLocal()
-    try:
-        conversations = db.query(Conversation).filter(
-            Conversation.user_id == user_id
-        ).order_by(Conversation.created_at.desc()).all()
-        
-        return [
-            {
-                "id": c.id,
-                "title": c.title,
-                "created_at": c.created_at.isoformat(),
-                "message_count": len(c.messages)
-            }
-            for c in conversations
-        ]
-    finally:
-        db.close()
+async def get_conversations(request: Request, user_id: int, limit: int = 50, cursor: str = None):
+    """Newest first, keyset-paginated on (created_at, id); one query per page."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    # Counted per returned row off the (conversation_id, created_at) index; no transcript text is loaded
+    message_count = select(func.count(Message.id)).where(
+        Message.conversation_id == Conversation.id
+    ).scalar_subquery()
+    
+    query = select(
+        Conversation.id, Conversation.title, Conversation.created_at, message_count.label("message_count")
+    ).where(Conversation.user_id == user_id)
+    if cursor:
+        before_created, before_id = decode_cursor(cursor, datetime, int)
+        query = query.where(or_(
+            Conversation.created_at < before_created,
+            and_(Conversation.created_at == before_created, Conversation.id < before_id)
+        ))
+    query = query.order_by(Conversation.created_at.desc(), Conversation.id.desc()).limit(limit + 1)
+    
+    async with SessionLocal() as db:
+        rows = (await db.execute(query)).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return page_response(
+        request, [row_to_dict(r, ("id", "title", "created_at", "message_count")) for r in rows], next_cursor
+    )
 
 
 @app.post("/api/users/{user_id}/conversations")
 async def create_conversation(user_id: int):
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         conversation = Conversation(user_id=user_id, title="New Conversation")
         db.add(conversation)
-        db.commit()
-        db.refresh(conversation)
+        await db.commit()
         return {"id": conversation.id, "title": conversation.title}
-    finally:
-        db.close()
+
+
+MESSAGE_FIELDS = ("id", "role", "content", "created_at")
+RUN_FIELDS = ("id", "distance_miles", "duration_minutes", "pace_per_mile", "pace_seconds", "notes", "run_date")
 
 
 @app.get("/api/conversations/{conversation_id}/messages")
-async def get_messages(conversation_id: int):
-    db = SessionLocal()
-    try:
-        messages = db.query(Message).filter(
-            Message.conversation_id == conversation_id
-        ).order_by(Message.created_at).all()
-        
-        return [
-            {
-                "id": m.id,
-                "role": m.role,
-                "content": m.content,
-                "created_at": m.created_at.isoformat()
-            }
-            for m in messages
-        ]
-    finally:
-        db.close()
+async def get_messages(request: Request, conversation_id: int, limit: int = 100, cursor: str = None, fields: str = None):
+    """Oldest first, keyset-paginated on (created_at, id); pass X-Next-Cursor back as `cursor`."""
+    fields = parse_fields(fields, MESSAGE_FIELDS)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    # Only the requested columns, plus the sort key for the cursor
+    columns = {f: getattr(Message, f) for f in ("created_at", "id") + fields}
+    
+    query = select(*columns.values()).where(Message.conversation_id == conversation_id)
+    if cursor:
+        after_created, after_id = decode_cursor(cursor, datetime, int)
+        query = query.where(or_(
+            Message.created_at > after_created,
+            and_(Message.created_at == after_created, Message.id > after_id)
+        ))
+    query = query.order_by(Message.created_at, Message.id).limit(limit + 1)
+    
+    async with SessionLocal() as db:
+        rows = (await db.execute(query)).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return page_response(request, [row_to_dict(r, fields) for r in rows], next_cursor)
 
 
 @app.get("/api/users/{user_id}/runs")
-async def get_runs(user_id: int, limit: int = 20):
-    db = SessionLocal()
-    try:
-        from database import Run
-        runs = db.query(Run).filter(
-            Run.user_id == user_id
-        ).order_by(Run.run_date.desc()).limit(limit).all()
-        
-        return [
-            {
-                "id": r.id,
-                "distance_miles": r.distance_miles,
-                "duration_minutes": r.duration_minutes,
-                "pace_per_mile": r.pace_per_mile,
-                "notes": r.notes,
-                "run_date": r.run_date.isoformat()
-            }
-            for r in runs
-        ]
-    finally:
-        db.close()
+async def get_runs(request: Request, user_id: int, limit: int = 20, cursor: str = None, fields: str = None):
+    """Newest first, keyset-paginated on (run_date, id); pass X-Next-Cursor back as `cursor`."""
+    fields = parse_fields(fields, RUN_FIELDS)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    columns = {f: getattr(Run, f) for f in ("run_date", "id") + fields}
+    
+    query = select(*columns.values()).where(Run.user_id == user_id)
+    if cursor:
+        before_date, before_id = decode_cursor(cursor, date, int)
+        query = query.where(or_(
+            Run.run_date < before_date,
+            and_(Run.run_date == before_date, Run.id < before_id)
+        ))
+    query = query.order_by(Run.run_date.desc(), Run.id.desc()).limit(limit + 1)
+    
+    async with SessionLocal() as db:
+        rows = (await db.execute(query)).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].run_date, rows[-1].id)
+    return page_response(request, [row_to_dict(r, fields) for r in rows], next_cursor)
+
+
+@app.get("/api/users/{user_id}/training-load")
+async def get_user_training_load(user_id: int):
+    async with SessionLocal() as db:
+        return await training_load.get_state(db, user_id)
+
+
+@app.get("/api/users/{user_id}/race-predictions")
+async def get_race_predictions(user_id: int, distance_miles: float = None):
+    async with SessionLocal() as db:
+        return await predict_race_time(db, user_id, distance_miles)
+
+
+@app.get("/api/users/{user_id}/records")
+async def get_user_records(user_id: int, distance_miles: float = None):
+    async with SessionLocal() as db:
+        return await get_personal_records(db, user_id, distance_miles)
 
 
 @app.get("/api/users/{user_id}/goals")
 async def get_user_goals(user_id: int):
-    db = SessionLocal()
-    try:
-        from database import Goal
-        from datetime import date
-        goals = db.query(Goal).filter(
-            Goal.user_id == user_id,
-            Goal.race_date >= date.today()
-        ).order_by(Goal.race_date).all()
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(Goal).where(
+                Goal.user_id == user_id,
+                Goal.race_date >= date.today()
+            ).order_by(Goal.race_date)
+        )
+        goals = result.scalars().all()
         
-        return [
-            {
-                "id": g.id,
-                "race_name": g.race_name,
-                "race_date": g.race_date.isoformat(),
-                "target_time": g.target_time,
-                "distance_miles": g.distance_miles
-            }
-            for g in goals
-        ]
-    finally:
-        db.close()
+        return [goal_to_dict(g) for g in goals]
+
+
+@app.get("/api/users/{user_id}/export/{kind}")
+async def export_history(user_id: int, kind: str, format: str = "ndjson", gzip: bool = False):
+    """Stream a runner's full runs, goals or messages history as NDJSON or CSV."""
+    if kind not in EXPORTS:
+        raise HTTPException(status_code=404, detail=f"Unknown export: {kind}")
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    
+    filename = f"stride-user{user_id}-{kind}.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        stream_export(kind, user_id, format, compress=gzip),
+        media_type="application/gzip" if gzip else FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@app.post("/api/users/{user_id}/import")
+async def import_runs(request: Request, user_id: int, format: str):
+    """Import a GPX, TCX or CSV file sent as the raw request body, parsed as it streams in."""
+    if format not in run_import.FORMATS:
+        raise HTTPException(status_code=400, detail="format must be gpx, tcx or csv")
+    
+    async with SessionLocal() as db:
+        importer = run_import.RunImporter(db, user_id)
+        try:
+            unusable = await run_import.import_chunks(importer, format, request.stream())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        finally:
+            # Earlier batches are already committed; refresh caches and notify whatever happened
+            summary = await importer.finish()
+    return {**summary, "unusable_rows": unusable}
 
 
 # ============ WebSocket for Voice Chat ============
 
+RUNNER_CONTEXT_TIMEOUT = float(os.getenv("RUNNER_CONTEXT_TIMEOUT", "1.5"))
+
+
+async def load_runner_context(user_id: int) -> str:
+    """Build the per-runner instructions suffix; this also warms the context cache."""
+    try:
+        async with SessionLocal() as db:
+            return await build_runner_context(db, user_id)
+    except Exception as e:
+        print(f"Runner context error: {e}")
+        return ""
+
+
 @app.websocket("/ws/chat/{user_id}")
 async def websocket_chat(websocket: WebSocket, user_id: int):
     """WebSocket endpoint for real-time voice chat."""
     await websocket.accept()
     
-    db = SessionLocal()
-    
     try:
-        # Create or get user
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            user = User(id=user_id, name="Runner")
-            db.add(user)
-            db.commit()
-        
-        # Create a new conversation
-        conversation = Conversation(user_id=user_id, title="Voice Chat")
-        db.add(conversation)
-        db.commit()
-        conversation_id = conversation.id
+        # Short-lived sessions so an idle voice chat never pins a pooled connection
+        async with SessionLocal() as db:
+            # Create or get user
+            user = await db.get(User, user_id)
+            if not user:
+                user = User(id=user_id, name="Runner")
+                db.add(user)
+                await db.commit()
+            
+            # Create a new conversation
+            conversation = Conversation(user_id=user_id, title="Voice Chat")
+            db.add(conversation)
+            await db.commit()
+            conversation_id = conversation.id
         
-        # Connect to OpenAI Realtime API
-        headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "OpenAI-Beta": "realtime=v1"
-        }
+        # Build the runner's context while the upstream handshake is in flight
+        context_task = asyncio.create_task(load_runner_context(user_id))
         
-        async with websockets.connect(OPENAI_REALTIME_URL, extra_headers=headers) as openai_ws:
+        # Check out a connected, pre-configured OpenAI Realtime session
+        async with realtime_pool.session() as openai_ws:
             
-            # Configure the session
-            session_config = {
-                "type": "session.update",
-                "session": {
-                    "modalities": ["text", "audio"],
-                    "instructions": SYSTEM_PROMPT,
-                    "voice": "alloy",
-                    "input_audio_format": "pcm16",
-                    "output_audio_format": "pcm16",
-                    "input_audio_transcription": {
-                        "model": "whisper-1"
-                    },
-                    "turn_detection": {
-                        "type": "server_vad",
-                        "threshold": 0.5,
-                        "prefix_padding_ms": 300,
-                        "silence_duration_ms": 500
-                    },
-                    "tools": TOOLS,
-                    "tool_choice": "auto"
-                }
-            }
+            # Don't hold up the session on a slow database; fall back to the static prompt
+            try:
+                runner_context = await asyncio.wait_for(asyncio.shield(context_task), RUNNER_CONTEXT_TIMEOUT)
+            except asyncio.TimeoutError:
+                runner_context = ""
             
-            await openai_ws.send(json.dumps(session_config))
+            # The pool already sent the base config; add this runner's context
+            if runner_context:
+                await openai_ws.send(dumps({
+                    "type": "session.update",
+                    "session": {"instructions": SYSTEM_PROMPT + runner_context}
+                }))
+            
+            coalescer = AudioCoalescer()
+            turn_detection = SESSION_CONFIG["turn_detection"]
+            gate = VoiceGate(
+                turn_detection["prefix_padding_ms"], turn_detection["silence_duration_ms"]
+            ) if RELAY_VAD_GATE else None
+            
+            # Bounded queue per direction so a slow peer costs dropped audio, not memory
+            to_upstream = Outbox("to_upstream", openai_ws.send, openai_ws.send, RELAY_UPSTREAM_AUDIO_BUFFER_BYTES)
+            to_client = Outbox("to_client", websocket.send_bytes, websocket.send_text, RELAY_CLIENT_AUDIO_BUFFER_BYTES)
+            
+            # Runs and goals committed anywhere for this user show up in the training log
+            def push_training_event(event):
+                to_client.put(dumps(event))
+            
+            training_events.subscribe(user_id, push_training_event)
+            
+            # When the user's turn was committed, until the reply's first audio arrives
+            commit_at = None
             
             async def receive_from_client():
                 """Receive audio from frontend and forward to OpenAI."""
+                nonlocal commit_at
                 try:
                     while True:
                         data = await websocket.receive()
                         
-                        if "bytes" in data:
-                            # Audio data - forward to OpenAI
-                            audio_base64 = base64.b64encode(data["bytes"]).decode()
-                            audio_event = {
-                                "type": "input_audio_buffer.append",
-                                "audio": audio_base64
-                            }
-                            await openai_ws.send(json.dumps(audio_event))
+                        if data["type"] == "websocket.disconnect":
+                            return
+                        
+                        if data.get("bytes") is not None:
+                            # Audio data - forward to OpenAI in chunks of at least AUDIO_CHUNK_MS
+                            audio = data["bytes"]
+                            if gate is not None:
+                                audio = gate.push(audio)
+                                if audio is None:
+                                    continue
+                            chunk = coalescer.push(audio)
+                            if chunk:
+                                to_upstream.put_audio(audio_append_event(chunk))
                         
-                        elif "text" in data:
+                        elif data.get("text") is not None:
                             # Text command from frontend
-                            msg = json.loads(data["text"])
+                            msg = loads(data["text"])
+                            
+                            # Anything still buffered belongs before the command
+                            chunk = coalescer.flush()
+                            if chunk:
+                                to_upstream.put_audio(audio_append_event(chunk))
                             
                             if msg.get("type") == "commit_audio":
-                                await openai_ws.send(json.dumps({
+                                commit_at = time.perf_counter()
+                                to_upstream.put(dumps({
                                     "type": "input_audio_buffer.commit"
                                 }))
                             
                             elif msg.get("type") == "text_message":
                                 # Send text message
-                                await openai_ws.send(json.dumps({
+                                to_upstream.put(dumps({
                                     "type": "conversation.item.create",
                                     "item": {
                                         "type": "message",
@@ -262,123 +414,185 @@ async def websocket_chat(websocket: WebSocket, user_id: int):
                                         ]
                                     }
                                 }))
-                                await openai_ws.send(json.dumps({"type": "response.create"}))
+                                to_upstream.put(dumps({"type": "response.create"}))
                 
                 except WebSocketDisconnect:
                     pass
             
+            # Tool calls run as tasks keyed by the response that requested them
+            pending_calls = {}
+            background_tasks = set()
+            
+            def spawn(coro):
+                task = asyncio.create_task(coro)
+                background_tasks.add(task)
+                task.add_done_callback(background_tasks.discard)
+                return task
+            
+            async def run_function_call(event):
+                """Execute one tool call and hand its output back to OpenAI."""
+                function_name = event.get("name")
+                call_id = event.get("call_id")
+                try:
+                    arguments = loads(event.get("arguments") or "{}")
+                except json.JSONDecodeError:
+                    arguments = {}
+                
+                # Execute the function
+                async with SessionLocal() as db:
+                    result = await execute_function(db, user_id, function_name, arguments)
+                
+                try:
+                    # Send result back to OpenAI
+                    to_upstream.put(dumps({
+                        "type": "conversation.item.create",
+                        "item": {
+                            "type": "function_call_output",
+                            "call_id": call_id,
+                            "output": dumps(result)
+                        }
+                    }))
+                    
+                    # Notify frontend about function call
+                    to_client.put(dumps({
+                        "type": "function_call",
+                        "name": function_name,
+                        "arguments": arguments,
+                        "result": result
+                    }))
+                except Exception as e:
+                    print(f"Function call relay error: {e}")
+            
+            async def finish_response(tasks):
+                """Trigger one follow-up response once every tool output is in."""
+                await asyncio.gather(*tasks, return_exceptions=True)
+                try:
+                    to_upstream.put(dumps({"type": "response.create"}))
+                except Exception as e:
+                    print(f"Function call relay error: {e}")
+            
             async def receive_from_openai():
                 """Receive from OpenAI and forward to frontend."""
+                nonlocal commit_at
                 try:
                     async for message in openai_ws:
-                        event = json.loads(message)
+                        received_at = time.perf_counter()
+                        
+                        # Audio deltas are most of the traffic; skip the full parse for them
+                        audio_data = peek_audio_delta(message)
+                        if audio_data is not None:
+                            if commit_at is not None:
+                                first_audio_seconds.observe(received_at - commit_at)
+                                commit_at = None
+                            to_client.put_audio(audio_data, received_at, "response.audio.delta")
+                            continue
+                        
+                        event = loads(message)
                         event_type = event.get("type", "")
                         
                         # Forward audio to client
                         if event_type == "response.audio.delta":
-                            audio_data = base64.b64decode(event["delta"])
-                            await websocket.send_bytes(audio_data)
+                            if commit_at is not None:
+                                first_audio_seconds.observe(received_at - commit_at)
+                                commit_at = None
+                            to_client.put_audio(base64.b64decode(event["delta"]), received_at, event_type)
+                        
+                        # Server VAD commits the turn itself
+                        elif event_type == "input_audio_buffer.committed":
+                            if commit_at is None:
+                                commit_at = received_at
                         
                         # Forward transcripts
                         elif event_type == "conversation.item.input_audio_transcription.completed":
                             transcript = event.get("transcript", "")
                             if transcript:
-                                # Save user message to database
-                                msg = Message(
-                                    conversation_id=conversation_id,
-                                    role="user",
-                                    content=transcript
-                                )
-                                db.add(msg)
-                                db.commit()
+                                # Queue user message for the next bulk insert
+                                transcript_writer.add(user_id, conversation_id, "user", transcript)
                                 
-                                await websocket.send_text(json.dumps({
+                                to_client.put(dumps({
                                     "type": "user_transcript",
                                     "text": transcript
-                                }))
+                                }), received_at, event_type)
                         
                         elif event_type == "response.audio_transcript.delta":
-                            await websocket.send_text(json.dumps({
+                            to_client.put(dumps({
                                 "type": "assistant_transcript_delta",
                                 "text": event.get("delta", "")
-                            }))
+                            }), received_at, event_type)
                         
                         elif event_type == "response.audio_transcript.done":
                             transcript = event.get("transcript", "")
                             if transcript:
-                                # Save assistant message to database
-                                msg = Message(
-                                    conversation_id=conversation_id,
-                                    role="assistant",
-                                    content=transcript
-                                )
-                                db.add(msg)
-                                db.commit()
+                                # Queue assistant message for the next bulk insert
+                                transcript_writer.add(user_id, conversation_id, "assistant", transcript)
                                 
-                                await websocket.send_text(json.dumps({
+                                to_client.put(dumps({
                                     "type": "assistant_transcript",
                                     "text": transcript
-                                }))
+                                }), received_at, event_type)
                         
                         # Handle function calls
                         elif event_type == "response.function_call_arguments.done":
-                            function_name = event.get("name")
-                            arguments = json.loads(event.get("arguments", "{}"))
-                            call_id = event.get("call_id")
-                            
-                            # Execute the function
-                            result = await execute_function(db, user_id, function_name, arguments)
-                            
-                            # Send result back to OpenAI
-                            await openai_ws.send(json.dumps({
-                                "type": "conversation.item.create",
-                                "item": {
-                                    "type": "function_call_output",
-                                    "call_id": call_id,
-                                    "output": json.dumps(result)
-                                }
-                            }))
-                            
-                            # Trigger response generation
-                            await openai_ws.send(json.dumps({"type": "response.create"}))
-                            
-                            # Notify frontend about function call
-                            await websocket.send_text(json.dumps({
-                                "type": "function_call",
-                                "name": function_name,
-                                "arguments": arguments,
-                                "result": result
-                            }))
+                            # Don't block the event loop on the tool; calls from one response run concurrently
+                            task = spawn(run_function_call(event))
+                            pending_calls.setdefault(event.get("response_id"), []).append(task)
+                        
+                        elif event_type == "response.done":
+                            tasks = pending_calls.pop(event.get("response", {}).get("id"), None)
+                            if tasks:
+                                spawn(finish_response(tasks))
                         
                         # Handle errors
                         elif event_type == "error":
                             error_msg = event.get("error", {}).get("message", "Unknown error")
                             # Don't show buffer too small errors to user
                             if "buffer too small" not in error_msg.lower():
-                                await websocket.send_text(json.dumps({
+                                to_client.put(dumps({
                                     "type": "error",
                                     "message": error_msg
-                                }))
+                                }), received_at, event_type)
                 
                 except Exception as e:
                     print(f"OpenAI WebSocket error: {e}")
             
-            # Run both tasks concurrently
-            await asyncio.gather(
-                receive_from_client(),
-                receive_from_openai()
-            )
+            # Two readers feeding two bounded senders; whichever stops first ends the session
+            tasks = [
+                asyncio.create_task(receive_from_client()),
+                asyncio.create_task(receive_from_openai()),
+                asyncio.create_task(to_upstream.run()),
+                asyncio.create_task(to_client.run())
+            ]
+            relay_stats.active_sessions += 1
+            try:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                relay_stats.active_sessions -= 1
+                training_events.unsubscribe(user_id, push_training_event)
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                # Tool calls still running may finish, but their output goes nowhere
+                to_upstream.close()
+                to_client.close()
+                if gate is not None:
+                    relay_stats.vad_received_bytes += gate.received_bytes
+                    relay_stats.vad_suppressed_bytes += gate.suppressed_bytes
+            
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    print(f"Relay error: {task.exception()}")
     
     except WebSocketDisconnect:
         print(f"Client disconnected: user_id={user_id}")
     except Exception as e:
         print(f"WebSocket error: {e}")
-        await websocket.send_text(json.dumps({
+        await websocket.send_text(dumps({
             "type": "error",
             "message": str(e)
         }))
     finally:
-        db.close()
+        # Make sure this session's transcripts are on disk before we let go
+        await transcript_writer.flush()
 
 
 if __name__ == "__main__":
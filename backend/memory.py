@@ -0,0 +1,256 @@
+import os
+import re
+import asyncio
+import argparse
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import SessionLocal, init_db, Conversation, Message, MessageEmbedding
+
+SEMANTIC_MEMORY = os.getenv("SEMANTIC_MEMORY", "true").lower() in ("1", "true", "yes")
+MEMORY_MAX_USERS = int(os.getenv("MEMORY_MAX_USERS", "1000"))
+MEMORY_MIN_SCORE = float(os.getenv("MEMORY_MIN_SCORE", "0.2"))
+
+EMBEDDING_DIM = 256
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "did", "do", "for", "from",
+    "had", "has", "have", "i", "im", "in", "is", "it", "its", "me", "my", "of", "on",
+    "or", "so", "that", "the", "this", "to", "was", "we", "were", "with", "you", "your"
+}
+
+# Words a runner uses interchangeably, folded onto one shared feature
+CONCEPTS = {
+    "pain": ["pain", "hurt", "sore", "ache", "achy", "painful", "tender", "injur", "niggle", "tweak", "strain"],
+    "tight": ["tight", "stiff", "cramp", "knot"],
+    "tired": ["tired", "fatigu", "exhaust", "drain", "dead", "heavy", "sluggish"],
+    "knee": ["knee", "patella", "itb", "it band"],
+    "foot": ["foot", "feet", "heel", "arch", "plantar", "toe", "ankle", "achilles"],
+    "leg": ["calf", "calves", "shin", "hamstring", "quad", "hip", "glute"],
+    "race": ["race", "marathon", "half", "5k", "10k", "pr", "pb"],
+    "speed": ["tempo", "interval", "track", "repeat", "fartlek", "threshold", "workout"],
+    "long": ["long run", "long", "endurance", "distance"],
+    "sleep": ["sleep", "rest", "recover", "recovery", "nap"],
+}
+_CONCEPT_PATTERN = re.compile("|".join(
+    rf"(?P<{concept}>\b(?:" + "|".join(re.escape(w) for w in words) + "))"
+    for concept, words in CONCEPTS.items()
+))
+
+
+def _stem(word: str) -> str:
+    for suffix in ("ing", "ed", "es", "ly", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def _features(content: str) -> list:
+    """(feature, weight) pairs: stemmed words, their trigrams and matched concepts."""
+    content = (content or "").lower()
+    features = []
+    for word in re.findall(r"[a-z0-9]+", content):
+        if word in STOPWORDS:
+            continue
+        stem = _stem(word)
+        features.append(("w:" + stem, 1.0))
+        padded = f"#{stem}#"
+        features.extend(("t:" + padded[i:i + 3], 0.3) for i in range(len(padded) - 2))
+    for concept in {m.lastgroup for m in _CONCEPT_PATTERN.finditer(content)}:
+        features.append(("c:" + concept, 2.0))
+    return features
+
+
+@lru_cache(maxsize=65536)
+def _slot(feature: str) -> tuple:
+    """(dimension, sign) for a feature; blake2b rather than hash() so it's stable across processes."""
+    digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+    return (digest >> 1) % EMBEDDING_DIM, 1.0 if digest & 1 else -1.0
+
+
+def embed(content: str) -> np.ndarray:
+    """Signed feature-hashing embedding, L2-normalised."""
+    dims = []
+    weights = []
+    for feature, weight in _features(content):
+        dim, sign = _slot(feature)
+        dims.append(dim)
+        weights.append(sign * weight)
+    vector = np.bincount(dims, weights=weights, minlength=EMBEDDING_DIM).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+def to_bytes(vector: np.ndarray) -> bytes:
+    return vector.astype(np.float16).tobytes()
+
+
+def from_bytes(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+
+
+class _UserVectors:
+    """Growable (ids, matrix) pair for one user's messages."""
+
+    def __init__(self, capacity: int = 64):
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.matrix = np.zeros((capacity, EMBEDDING_DIM), dtype=np.float32)
+        self.size = 0
+        self._known = set()
+
+    def add(self, message_id: int, vector: np.ndarray):
+        if message_id in self._known:
+            return
+        if self.size == len(self.ids):
+            capacity = len(self.ids) * 2
+            self.ids = np.resize(self.ids, capacity)
+            self.matrix = np.resize(self.matrix, (capacity, EMBEDDING_DIM))
+        self.ids[self.size] = message_id
+        self.matrix[self.size] = vector
+        self.size += 1
+        self._known.add(message_id)
+
+    def extend(self, message_ids: list, matrix: np.ndarray):
+        """Bulk-load an empty index."""
+        count = len(message_ids)
+        self.ids[:count] = message_ids
+        self.matrix[:count] = matrix
+        self.size = count
+        self._known.update(message_ids)
+
+    def search(self, query: np.ndarray, k: int) -> list:
+        if self.size == 0:
+            return []
+        scores = self.matrix[:self.size] @ query
+        k = min(k, self.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.ids[i]), float(scores[i])) for i in top]
+
+
+class MemoryIndex:
+    """Per-user in-memory vector index over message embeddings, LRU-evicted by user.
+
+    A cold user's index is loaded by one task that every concurrent
+    search awaits, so only that task ever installs it.
+    """
+
+    def __init__(self, max_users: int = MEMORY_MAX_USERS):
+        self.max_users = max_users
+        self._users = OrderedDict()
+        self._loading = {}
+        # Vectors that arrive while a user's index is being loaded
+        self._arrivals = {}
+
+    def add(self, user_id: int, message_id: int, vector: np.ndarray):
+        """Append a freshly saved message if this user's index is resident."""
+        if user_id in self._users:
+            self._users[user_id].add(message_id, vector)
+        elif user_id in self._arrivals:
+            self._arrivals[user_id].append((message_id, vector))
+
+    def _start_load(self, user_id: int) -> asyncio.Task:
+        task = self._loading.get(user_id)
+        if task is None:
+            self._arrivals[user_id] = []
+            task = asyncio.create_task(self._load(user_id))
+            self._loading[user_id] = task
+            task.add_done_callback(lambda t: self._finish(user_id, t))
+        return task
+
+    def _finish(self, user_id: int, task: asyncio.Task):
+        self._loading.pop(user_id, None)
+        self._arrivals.pop(user_id, None)
+        # A load whose searchers were all cancelled must not log "exception never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    async def _load(self, user_id: int) -> _UserVectors:
+        # Its own session: the searches awaiting this load may each be cancelled
+        async with SessionLocal() as db:
+            result = await db.execute(
+                select(MessageEmbedding.message_id, MessageEmbedding.vector)
+                .where(MessageEmbedding.user_id == user_id)
+            )
+            rows = result.all()
+        vectors = _UserVectors(capacity=max(64, len(rows) * 2))
+        if rows:
+            # Decode the whole history in one frombuffer call
+            matrix = from_bytes(b"".join(blob for _, blob in rows)).reshape(len(rows), EMBEDDING_DIM)
+            vectors.extend([message_id for message_id, _ in rows], matrix)
+        for message_id, vector in self._arrivals.pop(user_id, []):
+            vectors.add(message_id, vector)
+
+        self._users[user_id] = vectors
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        return vectors
+
+    async def search(self, user_id: int, query: str, k: int = 5) -> list:
+        """Top-k (message_id, score) pairs for query over the user's full history."""
+        vectors = self._users.get(user_id)
+        if vectors is None:
+            vectors = await asyncio.shield(self._start_load(user_id))
+        else:
+            self._users.move_to_end(user_id)
+        return [
+            (message_id, score)
+            for message_id, score in vectors.search(embed(query), k)
+            if score >= MEMORY_MIN_SCORE
+        ]
+
+
+# Shared across all sessions in this process
+memory_index = MemoryIndex()
+
+
+async def index_messages(db: AsyncSession, messages: list) -> list:
+    """Store embeddings for (message_id, user_id, content) triples. Caller commits.
+
+    Returns (user_id, message_id, vector) triples to hand to memory_index
+    once the transaction is committed.
+    """
+    entries = [(user_id, message_id, embed(content)) for message_id, user_id, content in messages]
+    if entries:
+        await db.execute(
+            MessageEmbedding.__table__.insert(),
+            [{"message_id": m, "user_id": u, "vector": to_bytes(v)} for u, m, v in entries]
+        )
+    return entries
+
+
+async def rebuild(db: AsyncSession, batch_size: int = 1000) -> int:
+    """Embed every message that has no stored vector yet."""
+    count = 0
+    while True:
+        result = await db.execute(
+            select(Message.id, Conversation.user_id, Message.content)
+            .join(Conversation, Conversation.id == Message.conversation_id)
+            .outerjoin(MessageEmbedding, MessageEmbedding.message_id == Message.id)
+            .where(MessageEmbedding.message_id.is_(None))
+            .limit(batch_size)
+        )
+        batch = result.all()
+        if not batch:
+            return count
+        await index_messages(db, batch)
+        await db.commit()
+        count += len(batch)
+
+
+async def _main():
+    await init_db()
+    async with SessionLocal() as db:
+        count = await rebuild(db)
+    print(f"Embedded {count} messages")
+
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(description="Backfill semantic memory embeddings for existing messages.").parse_args()
+    asyncio.run(_main())
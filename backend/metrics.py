@@ -0,0 +1,167 @@
+import time
+from bisect import bisect_left
+from sqlalchemy import event
+
+# Latency buckets in seconds
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+SLOW_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Prometheus histogram with at most one label.
+
+    observe() is a bisect and two additions, cheap enough for the
+    per-message relay path; cumulative buckets are only built when
+    /metrics is scraped.
+    """
+
+    def __init__(self, name: str, help: str, buckets: tuple, label: str = None):
+        self.name = name
+        self.help = help
+        self.bounds = buckets
+        self.label = label
+        self._series = {}
+
+    def observe(self, value: float, label_value: str = ""):
+        series = self._series.get(label_value)
+        if series is None:
+            series = self._series[label_value] = [[0] * (len(self.bounds) + 1), 0.0]
+        series[0][bisect_left(self.bounds, value)] += 1
+        series[1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_value, (counts, total) in sorted(self._series.items()):
+            labels = f'{self.label}="{_escape(label_value)}",' if self.label else ""
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{labels}le="{le}"}} {cumulative}')
+            suffix = f"{{{labels.rstrip(',')}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total!r}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Monotonic count with at most one label."""
+
+    def __init__(self, name: str, help: str, label: str = None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values = {}
+
+    def inc(self, label_value: str = "", amount: int = 1):
+        self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_value, value in sorted(self._values.items()):
+            labels = f'{{{self.label}="{_escape(label_value)}"}}' if self.label else ""
+            lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+
+class Metrics:
+    """Process-wide registry rendered in the Prometheus text format.
+
+    Besides its own histograms and counters, it exposes the existing
+    `stats()` dicts (relay, context cache, pool, ...) as gauges so one
+    scrape covers everything the /api/stats endpoints report.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._stats = []
+
+    def histogram(self, name: str, help: str, buckets: tuple = FAST_BUCKETS, label: str = None) -> Histogram:
+        metric = Histogram(name, help, buckets, label)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, label: str = None) -> Counter:
+        metric = Counter(name, help, label)
+        self._metrics.append(metric)
+        return metric
+
+    def register_stats(self, prefix: str, stats, label: str = "key"):
+        """Expose a `stats()` callable's numeric values as gauges; nested dicts become `label` series."""
+        self._stats.append((prefix, stats, label))
+
+    def _render_stats(self, prefix: str, stats, label: str) -> list:
+        lines = []
+        for key, value in stats().items():
+            name = f"stride_{prefix}_{key}"
+            if isinstance(value, dict):
+                lines.append(f"# TYPE {name} gauge")
+                lines.extend(
+                    f'{name}{{{label}="{_escape(k)}"}} {_number(v)}'
+                    for k, v in sorted(value.items()) if isinstance(v, (int, float))
+                )
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_number(value)}")
+        return lines
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for prefix, stats, label in self._stats:
+            try:
+                lines.extend(self._render_stats(prefix, stats, label))
+            except Exception as e:
+                print(f"Metrics error for {prefix}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+# Shared by every request and voice session in this process
+metrics = Metrics()
+
+function_seconds = metrics.histogram(
+    "stride_function_duration_seconds", "Tool call time in execute_function", SLOW_BUCKETS, "function"
+)
+function_errors = metrics.counter(
+    "stride_function_errors_total", "Tool calls that raised or timed out", "function"
+)
+db_query_seconds = metrics.histogram(
+    "stride_db_query_duration_seconds", "Database statement execution time", FAST_BUCKETS, "statement"
+)
+forward_seconds = metrics.histogram(
+    "stride_relay_forward_seconds", "Upstream event receipt to client send, by realtime event type",
+    FAST_BUCKETS, "event_type"
+)
+first_audio_seconds = metrics.histogram(
+    "stride_time_to_first_audio_seconds", "Audio buffer commit to the first audio delta of the reply",
+    SLOW_BUCKETS
+)
+
+
+def instrument_engine(engine):
+    """Time every statement on an async engine, labelled by its leading keyword."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _query_start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _query_end(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        db_query_seconds.observe(elapsed, statement.split(None, 1)[0].upper())
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _query_error(exception_context):
+        starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+        if starts:
+            starts.pop()
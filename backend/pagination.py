@@ -0,0 +1,66 @@
+import base64
+import hashlib
+from datetime import date, datetime
+from fastapi import HTTPException, Request, Response
+
+from relay_codec import dumps
+
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(*values) -> str:
+    """Opaque cursor for the last row of a page, from its sort key."""
+    raw = "|".join(v.isoformat() if isinstance(v, (date, datetime)) else str(v) for v in values)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types) -> tuple:
+    """Inverse of encode_cursor; `types` are the sort key's column types, in order."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        parts = raw.split("|")
+        if len(parts) != len(types):
+            raise ValueError(cursor)
+        return tuple(
+            t.fromisoformat(part) if t in (date, datetime) else t(part)
+            for t, part in zip(types, parts)
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_fields(fields: str, allowed: tuple) -> tuple:
+    """Requested columns in `allowed` order; all of them when `fields` is empty."""
+    if not fields:
+        return allowed
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(f for f in allowed if f in requested)
+
+
+def row_to_dict(row, fields: tuple) -> dict:
+    item = {}
+    for field in fields:
+        value = getattr(row, field)
+        item[field] = value.isoformat() if isinstance(value, (date, datetime)) else value
+    return item
+
+
+def page_response(request: Request, items: list, next_cursor: str = None) -> Response:
+    """JSON list response with an ETag; 304 when the client already has this page.
+
+    The next page's cursor goes in an X-Next-Cursor header so the body
+    stays a plain list.
+    """
+    body = dumps(items).encode()
+    etag = f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,113 @@
+from sqlalchemy import select, delete, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import dialect_insert, rebuild_main, PersonalRecord, Run
+
+# Each run lands in the bucket with the largest lower bound it reaches, in miles
+BUCKETS = [
+    ("1 mile", 1.0),
+    ("5K", 3.1),
+    ("5 miles", 5.0),
+    ("10K", 6.2),
+    ("10 miles", 10.0),
+    ("Half marathon", 13.1),
+    ("Marathon", 26.2),
+]
+BUCKET_ORDER = {name: i for i, (name, _) in enumerate(BUCKETS)}
+
+
+def pace_seconds(distance_miles: float, duration_minutes: float):
+    """Seconds per mile, or None when there is no distance."""
+    return duration_minutes * 60 / distance_miles if distance_miles and distance_miles > 0 else None
+
+
+def bucket_for(distance_miles: float):
+    bucket = None
+    for name, lower in BUCKETS:
+        if (distance_miles or 0) >= lower:
+            bucket = name
+    return bucket
+
+
+def _upsert(rows: list):
+    """Insert record rows, replacing a stored record only when the new run beats it."""
+    stmt = dialect_insert(PersonalRecord).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "bucket", "kind"],
+        set_={
+            "run_date": stmt.excluded.run_date,
+            "distance_miles": stmt.excluded.distance_miles,
+            "duration_minutes": stmt.excluded.duration_minutes,
+            "pace_seconds": stmt.excluded.pace_seconds
+        },
+        where=or_(
+            and_(PersonalRecord.kind == "fastest", stmt.excluded.pace_seconds < PersonalRecord.pace_seconds),
+            and_(PersonalRecord.kind == "longest", stmt.excluded.distance_miles > PersonalRecord.distance_miles)
+        )
+    )
+
+
+def _records(user_id: int, runs) -> list:
+    """Best fastest/longest row per bucket among (run_date, miles, minutes) runs."""
+    best = {}
+    for run_date, miles, minutes in runs:
+        bucket = bucket_for(miles)
+        if bucket is None or not minutes:
+            continue
+        row = {
+            "user_id": user_id, "bucket": bucket, "run_date": run_date, "distance_miles": miles,
+            "duration_minutes": minutes, "pace_seconds": pace_seconds(miles, minutes)
+        }
+        fastest = best.get((bucket, "fastest"))
+        if fastest is None or row["pace_seconds"] < fastest["pace_seconds"]:
+            best[(bucket, "fastest")] = {**row, "kind": "fastest"}
+        longest = best.get((bucket, "longest"))
+        if longest is None or miles > longest["distance_miles"]:
+            best[(bucket, "longest")] = {**row, "kind": "longest"}
+    return list(best.values())
+
+
+async def add_runs(db: AsyncSession, user_id: int, runs: list):
+    """Fold (run_date, miles, minutes) runs into the user's records, one upsert. Caller commits."""
+    rows = _records(user_id, runs)
+    if rows:
+        await db.execute(_upsert(rows))
+
+
+async def add_run(db: AsyncSession, user_id: int, run_date, miles: float, minutes: int):
+    await add_runs(db, user_id, [(run_date, miles, minutes)])
+
+
+async def get_records(db: AsyncSession, user_id: int, distance_miles: float = None) -> list:
+    """The user's records in bucket order; only the bucket `distance_miles` falls in, if given."""
+    query = select(PersonalRecord).where(PersonalRecord.user_id == user_id)
+    if distance_miles is not None:
+        query = query.where(PersonalRecord.bucket == bucket_for(distance_miles))
+    result = await db.execute(query)
+    return sorted(result.scalars().all(), key=lambda r: (BUCKET_ORDER[r.bucket], r.kind))
+
+
+async def rebuild(db: AsyncSession, user_id: int = None) -> int:
+    """Recompute records from the runs table. Returns the number of record rows written."""
+    clear = delete(PersonalRecord)
+    runs = select(Run.user_id, Run.run_date, Run.distance_miles, Run.duration_minutes).where(
+        Run.distance_miles >= BUCKETS[0][1]
+    )
+    if user_id is not None:
+        clear = clear.where(PersonalRecord.user_id == user_id)
+        runs = runs.where(Run.user_id == user_id)
+    await db.execute(clear)
+
+    by_user = {}
+    for uid, run_date, miles, minutes in await db.execute(runs):
+        by_user.setdefault(uid, []).append((run_date, miles, minutes))
+
+    rows = [row for uid, user_runs in by_user.items() for row in _records(uid, user_runs)]
+    if rows:
+        await db.execute(PersonalRecord.__table__.insert(), rows)
+    await db.commit()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    rebuild_main(rebuild, "Rebuild personal records from the runs table.", "Rebuilt {count} personal record rows")
@@ -15,6 +15,9 @@ You have access to these functions - use them proactively:
 - **get_weather**: Check weather when they're planning a run or ask about conditions.
 - **set_goal**: Help them set race goals with realistic targets.
 - **suggest_workout**: Recommend workouts based on their goals and recent training load.
+- **get_training_load**: Check fitness, fatigue and form (training-stress balance) before recommending hard sessions or when they ask if they're overdoing it.
+- **predict_race_time**: Estimate race times from their best recent effort, and whether their goal target is realistic, when they ask what they could run or how a goal is looking.
+- **get_personal_records**: Look up their fastest and longest runs by distance (mile, 5K, 5 miles, 10K, 10 miles, half, marathon) when they ask about PRs or bests.
 - **get_past_context**: Search past conversations when they reference something from before, or when you need context about injuries, preferences, etc.
 
 ## Guidelines
@@ -184,6 +187,46 @@ TOOLS = [
             "required": ["query"]
         }
     },
+    {
+        "type": "function",
+        "name": "get_training_load",
+        "description": "Get the user's training load: fitness (42-day chronic load), fatigue (7-day acute load) and form (training-stress balance). Use this to judge whether they need rest or can handle a hard session.",
+        "parameters": {
+            "type": "object",
+            "properties": {},
+            "required": []
+        }
+    },
+    {
+        "type": "function",
+        "name": "predict_race_time",
+        "description": "Predict race times (5K to marathon, plus any upcoming goal races) from the user's best effort in the past six months, and whether goal targets are on track.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "distance_miles": {
+                    "type": "number",
+                    "description": "Race distance to predict, if not a standard one"
+                }
+            },
+            "required": []
+        }
+    },
+    {
+        "type": "function",
+        "name": "get_personal_records",
+        "description": "Get the user's personal records: fastest pace and longest run in each distance bucket (1 mile, 5K, 5 miles, 10K, 10 miles, half marathon, marathon).",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "distance_miles": {
+                    "type": "number",
+                    "description": "Only return records for the bucket this distance falls in, e.g. 5 for a 5-miler"
+                }
+            },
+            "required": []
+        }
+    },
     {
         "type": "function",
         "name": "get_goals",
@@ -194,4 +237,23 @@ TOOLS = [
             "required": []
         }
     }
-]
\ No newline at end of file
+]
+
+# Base realtime session settings; instructions are added per session
+SESSION_CONFIG = {
+    "modalities": ["text", "audio"],
+    "voice": "alloy",
+    "input_audio_format": "pcm16",
+    "output_audio_format": "pcm16",
+    "input_audio_transcription": {
+        "model": "whisper-1"
+    },
+    "turn_detection": {
+        "type": "server_vad",
+        "threshold": 0.5,
+        "prefix_padding_ms": 300,
+        "silence_duration_ms": 500
+    },
+    "tools": TOOLS,
+    "tool_choice": "auto"
+}
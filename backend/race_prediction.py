@@ -0,0 +1,181 @@
+import os
+import re
+import math
+import functools
+from datetime import date, timedelta
+import numpy as np
+from sqlalchemy import select, delete, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import dialect_insert, Run, FitnessEstimate
+from context_cache import cached
+
+METERS_PER_MILE = 1609.344
+
+# Only efforts this recent count towards current fitness
+PREDICTION_WINDOW_DAYS = int(os.getenv("PREDICTION_WINDOW_DAYS", "180"))
+# Shorter runs give inflated scores, and anything past world-class is a logging mistake
+MIN_EFFORT_MILES = 1.0
+MAX_VDOT = 85.0
+
+STANDARD_DISTANCES = {
+    "5K": 3.107,
+    "10K": 6.214,
+    "Half marathon": 13.109,
+    "Marathon": 26.219,
+}
+
+
+def vdot(distance_miles, minutes):
+    """Daniels/Gilbert VDOT for one effort, or an array of them."""
+    t = np.asarray(minutes, dtype=np.float64)
+    v = np.asarray(distance_miles, dtype=np.float64) * METERS_PER_MILE / t
+    vo2 = -4.60 + 0.182258 * v + 0.000104 * v ** 2
+    fraction = 0.8 + 0.1894393 * np.exp(-0.012778 * t) + 0.2989558 * np.exp(-0.1932605 * t)
+    return vo2 / fraction
+
+
+def _vdot(meters: float, t: float) -> float:
+    # Scalar form of vdot() for the solver; plain floats are far cheaper than numpy here
+    v = meters / t
+    vo2 = -4.60 + 0.182258 * v + 0.000104 * v * v
+    return vo2 / (0.8 + 0.1894393 * math.exp(-0.012778 * t) + 0.2989558 * math.exp(-0.1932605 * t))
+
+
+@functools.lru_cache(maxsize=4096)
+def predict_minutes(score: float, distance_miles: float) -> float:
+    """Race time in minutes at which `distance_miles` is run at VDOT `score`."""
+    meters = distance_miles * METERS_PER_MILE
+    # VDOT falls as time rises; bisect between 36 km/h and a walk
+    low, high = meters / 600, meters / 50
+    for _ in range(40):
+        mid = (low + high) / 2
+        if _vdot(meters, mid) > score:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2
+
+
+def format_time(minutes: float) -> str:
+    seconds = int(round(minutes * 60))
+    hours, seconds = divmod(seconds, 3600)
+    mins, seconds = divmod(seconds, 60)
+    return f"{hours}:{mins:02d}:{seconds:02d}" if hours else f"{mins}:{seconds:02d}"
+
+
+def parse_race_time(text: str, distance_miles: float):
+    """Minutes from a target like "1:45:00", "22:30" or "3:30"; None if it isn't a time.
+
+    Two-part targets are read as M:SS unless that would be faster than
+    3:00/mile, in which case they are H:MM.
+    """
+    match = re.search(r"(\d+):(\d{2})(?::(\d{2}))?", text or "")
+    if not match:
+        return None
+    a, b, c = match.groups()
+    if c is not None:
+        return int(a) * 60 + int(b) + int(c) / 60
+    minutes = int(a) + int(b) / 60
+    if distance_miles and minutes / distance_miles < 3:
+        minutes = int(a) * 60 + int(b)
+    return minutes
+
+
+def _cutoff() -> date:
+    return date.today() - timedelta(days=PREDICTION_WINDOW_DAYS)
+
+
+def _best(runs: list, cutoff: date):
+    """(score, run_date, distance_miles, duration_minutes) of the best effort since cutoff, in one vectorized pass."""
+    runs = [r for r in runs if r[0] >= cutoff and (r[1] or 0) >= MIN_EFFORT_MILES and (r[2] or 0) > 0]
+    if not runs:
+        return None
+    scores = vdot([r[1] for r in runs], [r[2] for r in runs])
+    scores[scores > MAX_VDOT] = -np.inf
+    i = int(np.argmax(scores))
+    if not np.isfinite(scores[i]):
+        return None
+    return (float(scores[i]), *runs[i])
+
+
+async def _history(db: AsyncSession, user_id: int, cutoff: date) -> list:
+    result = await db.execute(
+        select(Run.run_date, Run.distance_miles, Run.duration_minutes).where(
+            Run.user_id == user_id,
+            Run.run_date >= cutoff,
+            Run.distance_miles >= MIN_EFFORT_MILES
+        )
+    )
+    return result.all()
+
+
+async def _store(db: AsyncSession, user_id: int, best: tuple, cutoff: date):
+    """Upsert an effort, replacing the stored one only if it scores higher or has aged out.
+
+    The comparison happens in the database, so concurrent writers can
+    only ever raise the estimate.
+    """
+    vdot_score, run_date, distance_miles, duration_minutes = best
+    stmt = dialect_insert(FitnessEstimate).values(
+        user_id=user_id, vdot=vdot_score, run_date=run_date,
+        distance_miles=distance_miles, duration_minutes=duration_minutes
+    )
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            "vdot": stmt.excluded.vdot,
+            "run_date": stmt.excluded.run_date,
+            "distance_miles": stmt.excluded.distance_miles,
+            "duration_minutes": stmt.excluded.duration_minutes
+        },
+        where=or_(stmt.excluded.vdot > FitnessEstimate.vdot, FitnessEstimate.run_date < cutoff)
+    ))
+
+
+async def add_runs(db: AsyncSession, user_id: int, runs: list):
+    """Fold (run_date, distance_miles, duration_minutes) runs into the stored estimate. Caller commits."""
+    cutoff = _cutoff()
+    best = _best(runs, cutoff)
+    if best is None:
+        return
+    stored = await db.scalar(select(FitnessEstimate.run_date).where(FitnessEstimate.user_id == user_id))
+    if stored is None or stored < cutoff:
+        # Nothing current stored; the new runs compete with the rest of the window
+        best = _best(await _history(db, user_id, cutoff) + list(runs), cutoff)
+    await _store(db, user_id, best, cutoff)
+
+
+async def add_run(db: AsyncSession, user_id: int, run_date: date, distance_miles: float, minutes: float):
+    await add_runs(db, user_id, [(run_date, distance_miles, minutes)])
+
+
+@cached("runs")
+async def get_estimate(db: AsyncSession, user_id: int) -> dict:
+    """The user's current fitness estimate; served from the context cache until their runs change."""
+    cutoff = _cutoff()
+    state = await db.get(FitnessEstimate, user_id, populate_existing=True)
+    if state is not None and state.run_date >= cutoff:
+        best = (state.vdot, state.run_date, state.distance_miles, state.duration_minutes)
+    else:
+        # First read, or the best effort aged out: recompute from the window
+        best = _best(await _history(db, user_id, cutoff), cutoff)
+        if best is None:
+            await db.execute(delete(FitnessEstimate).where(
+                FitnessEstimate.user_id == user_id, FitnessEstimate.run_date < cutoff
+            ))
+        else:
+            await _store(db, user_id, best, cutoff)
+        await db.commit()
+    if best is None:
+        return {"vdot": None}
+    return {
+        "vdot": round(best[0], 2),
+        "run_date": best[1],
+        "distance_miles": best[2],
+        "duration_minutes": best[3]
+    }
+
+
+def predictions(score: float) -> dict:
+    return {name: format_time(predict_minutes(score, miles)) for name, miles in STANDARD_DISTANCES.items()}
@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+import websockets
+from dotenv import load_dotenv
+
+from prompts import SYSTEM_PROMPT, SESSION_CONFIG
+
+load_dotenv()
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Point at a local fake realtime server for tests and benchmarks
+OPENAI_REALTIME_URL = os.getenv(
+    "OPENAI_REALTIME_URL",
+    "wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2025-06-03"
+)
+REALTIME_POOL_SIZE = int(os.getenv("REALTIME_POOL_SIZE", "2"))
+# Recycle idle sessions well before the upstream's own session limit
+REALTIME_POOL_MAX_AGE = float(os.getenv("REALTIME_POOL_MAX_AGE", "600"))
+REALTIME_POOL_CHECK_INTERVAL = float(os.getenv("REALTIME_POOL_CHECK_INTERVAL", "5"))
+
+
+class RealtimePool:
+    """Warm pool of connected, pre-configured upstream realtime sessions.
+
+    Idle sessions have already completed the TCP/TLS/WebSocket handshake
+    and received the base session.update, so a checkout only needs to
+    send the per-runner instructions. A background task tops the pool
+    back up, drops connections that closed (websockets' keepalive pings
+    close dead ones) and recycles any older than `max_age`. When the pool
+    is empty, checkout falls back to connecting inline.
+    """
+
+    def __init__(
+        self,
+        url: str = OPENAI_REALTIME_URL,
+        size: int = REALTIME_POOL_SIZE,
+        max_age: float = REALTIME_POOL_MAX_AGE,
+        check_interval: float = REALTIME_POOL_CHECK_INTERVAL
+    ):
+        self.url = url
+        self.size = size
+        self.max_age = max_age
+        self.check_interval = check_interval
+
+        self._idle = deque()
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+        self.warm_checkouts = 0
+        self.cold_checkouts = 0
+        self.recycled = 0
+        self.connect_errors = 0
+        self.last_connect_ms = 0.0
+
+    @property
+    def headers(self) -> dict:
+        return {
+            "Authorization": f"Bearer {OPENAI_API_KEY}",
+            "OpenAI-Beta": "realtime=v1"
+        }
+
+    async def connect(self):
+        """Open and configure a fresh upstream session."""
+        start = time.perf_counter()
+        ws = await websockets.connect(self.url, extra_headers=self.headers)
+        await ws.send(json.dumps({
+            "type": "session.update",
+            "session": {**SESSION_CONFIG, "instructions": SYSTEM_PROMPT}
+        }))
+        self.last_connect_ms = (time.perf_counter() - start) * 1000
+        return ws
+
+    def start(self):
+        if self._task is None and self.size > 0:
+            self._task = asyncio.create_task(self._maintain())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._idle:
+            _, ws = self._idle.popleft()
+            await ws.close()
+
+    def _usable(self, created_at: float, ws) -> bool:
+        return ws.open and time.monotonic() - created_at < self.max_age
+
+    @asynccontextmanager
+    async def session(self):
+        """Check out an upstream session; it's closed on exit, never returned to the pool."""
+        ws = None
+        while self._idle:
+            created_at, candidate = self._idle.popleft()
+            if self._usable(created_at, candidate):
+                ws = candidate
+                self.warm_checkouts += 1
+                break
+            self.recycled += 1
+            await candidate.close()
+        self._wakeup.set()
+
+        if ws is None:
+            self.cold_checkouts += 1
+            ws = await self.connect()
+
+        try:
+            yield ws
+        finally:
+            await ws.close()
+
+    async def _maintain(self):
+        backoff = 1.0
+        while True:
+            self._wakeup.clear()
+
+            try:
+                # Split off anything closed or past its age before awaiting, so a checkout can't race the sweep
+                usable, expired = deque(), []
+                for created_at, ws in self._idle:
+                    (usable if self._usable(created_at, ws) else expired).append((created_at, ws))
+                self._idle = usable
+                self.recycled += len(expired)
+                for _, ws in expired:
+                    await ws.close()
+
+                while len(self._idle) < self.size:
+                    ws = await self.connect()
+                    self._idle.append((time.monotonic(), ws))
+                backoff = 1.0
+                timeout = self.check_interval
+            except Exception as e:
+                self.connect_errors += 1
+                print(f"Realtime pool maintenance error: {e}")
+                timeout = backoff
+                backoff = min(backoff * 2, 60.0)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "idle": len(self._idle),
+            "warm_checkouts": self.warm_checkouts,
+            "cold_checkouts": self.cold_checkouts,
+            "recycled": self.recycled,
+            "connect_errors": self.connect_errors,
+            "last_connect_ms": round(self.last_connect_ms, 3)
+        }
+
+
+# Shared by every voice session in this process
+realtime_pool = RealtimePool()
@@ -0,0 +1,152 @@
+import os
+import re
+import json
+import binascii
+from collections import deque
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback; same output, just slower
+    orjson = None
+
+SAMPLE_RATE = 24000
+BYTES_PER_SAMPLE = 2
+# Client audio smaller than this is held back and sent as one append
+AUDIO_CHUNK_MS = int(os.getenv("AUDIO_CHUNK_MS", "40"))
+# Optional server-side speech gate, for clients that stream audio ungated
+RELAY_VAD_GATE = os.getenv("RELAY_VAD_GATE", "false").lower() == "true"
+RELAY_VAD_THRESHOLD_DBFS = float(os.getenv("RELAY_VAD_THRESHOLD_DBFS", "-45"))
+# Extra time past server_vad's silence window before the gate closes
+RELAY_VAD_HANGOVER_MARGIN_MS = int(os.getenv("RELAY_VAD_HANGOVER_MARGIN_MS", "200"))
+
+# base64 never contains '"' or '\\', so it can be spliced into JSON as-is
+_APPEND_PREFIX = '{"type":"input_audio_buffer.append","audio":"'
+_APPEND_SUFFIX = '"}'
+
+_AUDIO_DELTA_TYPE = re.compile(r'"type"\s*:\s*"response\.audio\.delta"')
+_DELTA_VALUE = re.compile(r'"delta"\s*:\s*"')
+
+
+def dumps(obj) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def audio_append_event(pcm: bytes) -> str:
+    """input_audio_buffer.append envelope without building a dict or running the encoder."""
+    return _APPEND_PREFIX + binascii.b2a_base64(pcm, newline=False).decode("ascii") + _APPEND_SUFFIX
+
+
+def peek_audio_delta(message) -> bytes:
+    """Decoded PCM if message is a response.audio.delta event, else None.
+
+    Only the first bytes are scanned for the type, so every other event
+    type costs one short regex search before the normal parse.
+    """
+    if not isinstance(message, str) or not _AUDIO_DELTA_TYPE.search(message, 0, 128):
+        return None
+    match = _DELTA_VALUE.search(message)
+    if match is None:
+        return None
+    end = message.find('"', match.end())
+    if end == -1:
+        return None
+    return binascii.a2b_base64(message[match.end():end])
+
+
+class AudioCoalescer:
+    """Joins small PCM16 frames into chunks of at least `chunk_ms` before forwarding."""
+
+    def __init__(self, chunk_ms: int = AUDIO_CHUNK_MS):
+        self.chunk_bytes = SAMPLE_RATE * BYTES_PER_SAMPLE * chunk_ms // 1000
+        self._buffer = bytearray()
+
+    def push(self, pcm: bytes) -> bytes:
+        """Add a frame; returns a chunk once enough audio is buffered, else None."""
+        if not self._buffer and len(pcm) >= self.chunk_bytes:
+            return pcm
+        self._buffer += pcm
+        if len(self._buffer) < self.chunk_bytes:
+            return None
+        return self.flush()
+
+    def flush(self) -> bytes:
+        """Whatever is buffered, e.g. before a commit; None if empty."""
+        if not self._buffer:
+            return None
+        chunk = bytes(self._buffer)
+        self._buffer.clear()
+        return chunk
+
+
+def _ms_to_bytes(ms: int) -> int:
+    return SAMPLE_RATE * BYTES_PER_SAMPLE * ms // 1000
+
+
+class VoiceGate:
+    """Energy gate that forwards speech plus padding and holds back silence.
+
+    Same policy as the browser's worklet gate: up to `prefix_padding_ms`
+    of audio from before speech is replayed when the gate opens, and it
+    stays open until `silence_duration_ms` plus a margin of quiet has
+    passed, so server_vad still sees the silence that ends the turn.
+    """
+
+    def __init__(self, prefix_padding_ms: int, silence_duration_ms: int,
+                 threshold_dbfs: float = RELAY_VAD_THRESHOLD_DBFS):
+        self.prefix_bytes = _ms_to_bytes(prefix_padding_ms)
+        self.hangover_bytes = _ms_to_bytes(silence_duration_ms + RELAY_VAD_HANGOVER_MARGIN_MS)
+        # Mean square of PCM16 samples at the threshold level
+        self.threshold = (32768 * 10 ** (threshold_dbfs / 20)) ** 2
+
+        self._open = False
+        self._silence_bytes = 0
+        self._preroll = deque()
+        self._preroll_bytes = 0
+
+        self.received_bytes = 0
+        self.forwarded_bytes = 0
+
+    def _is_speech(self, pcm: bytes) -> bool:
+        samples = np.frombuffer(pcm, dtype=np.int16, count=len(pcm) // BYTES_PER_SAMPLE).astype(np.float32)
+        return samples.size > 0 and float(np.dot(samples, samples)) / samples.size > self.threshold
+
+    def push(self, pcm: bytes) -> bytes:
+        """Audio to forward for this frame (with any replayed padding), or None while silent."""
+        self.received_bytes += len(pcm)
+        speech = self._is_speech(pcm)
+
+        if self._open:
+            self._silence_bytes = 0 if speech else self._silence_bytes + len(pcm)
+            if self._silence_bytes >= self.hangover_bytes:
+                self._open = False
+            self.forwarded_bytes += len(pcm)
+            return pcm
+
+        if not speech:
+            self._preroll.append(pcm)
+            self._preroll_bytes += len(pcm)
+            while self._preroll and self._preroll_bytes - len(self._preroll[0]) >= self.prefix_bytes:
+                self._preroll_bytes -= len(self._preroll.popleft())
+            return None
+
+        self._open = True
+        self._silence_bytes = 0
+        self._preroll.append(pcm)
+        chunk = b"".join(self._preroll)
+        self._preroll.clear()
+        self._preroll_bytes = 0
+        self.forwarded_bytes += len(chunk)
+        return chunk
+
+    @property
+    def suppressed_bytes(self) -> int:
+        return self.received_bytes - self.forwarded_bytes
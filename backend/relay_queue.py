@@ -0,0 +1,144 @@
+import os
+import time
+import asyncio
+from collections import deque
+
+from metrics import forward_seconds
+
+# 24 kHz PCM16 is 48 KB per second of audio
+RELAY_CLIENT_AUDIO_BUFFER_BYTES = int(os.getenv("RELAY_CLIENT_AUDIO_BUFFER_BYTES", str(48000 * 2)))
+# Upstream items are base64 JSON envelopes, about 4/3 the PCM size
+RELAY_UPSTREAM_AUDIO_BUFFER_BYTES = int(os.getenv("RELAY_UPSTREAM_AUDIO_BUFFER_BYTES", str(64000 * 2)))
+# Hard cap per direction including undroppable messages; past it the session is closed
+RELAY_SESSION_MAX_BYTES = int(os.getenv("RELAY_SESSION_MAX_BYTES", str(4 * 1024 * 1024)))
+
+
+class OutboxOverflow(Exception):
+    """A peer stopped draining messages that can't be dropped."""
+
+
+class RelayStats:
+    """Process-wide counters across every session's outboxes."""
+
+    def __init__(self):
+        self.active_sessions = 0
+        self.queued_bytes = {"to_client": 0, "to_upstream": 0}
+        self.max_queue_depth = {"to_client": 0, "to_upstream": 0}
+        self.dropped_audio = {"to_client": 0, "to_upstream": 0}
+        self.dropped_audio_bytes = {"to_client": 0, "to_upstream": 0}
+        self.sent_bytes = {"to_client": 0, "to_upstream": 0}
+        self.overflow_disconnects = 0
+        self.vad_received_bytes = 0
+        self.vad_suppressed_bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "active_sessions": self.active_sessions,
+            "queued_bytes": dict(self.queued_bytes),
+            "max_queue_depth": dict(self.max_queue_depth),
+            "dropped_audio": dict(self.dropped_audio),
+            "dropped_audio_bytes": dict(self.dropped_audio_bytes),
+            "sent_bytes": dict(self.sent_bytes),
+            "overflow_disconnects": self.overflow_disconnects,
+            "vad_received_bytes": self.vad_received_bytes,
+            "vad_suppressed_bytes": self.vad_suppressed_bytes
+        }
+
+
+relay_stats = RelayStats()
+
+
+class Outbox:
+    """Bounded FIFO between one reader and one slow writer.
+
+    Audio is droppable: once more than `max_audio_bytes` of it is
+    waiting, the oldest audio goes first, since stale audio is worthless
+    in a live conversation. Everything else (transcripts, tool results,
+    commits) is kept in order. If the total backlog passes `max_bytes`,
+    put() raises OutboxOverflow so the session can be torn down rather
+    than growing without bound.
+
+    Items forwarded from upstream can carry their receipt time and
+    event type, and the time until they reach the socket is recorded in
+    the relay forwarding histogram.
+    """
+
+    def __init__(self, direction: str, send_audio, send_message, max_audio_bytes: int,
+                 max_bytes: int = RELAY_SESSION_MAX_BYTES):
+        self.direction = direction
+        self._send_audio = send_audio
+        self._send_message = send_message
+        self.max_audio_bytes = max_audio_bytes
+        self.max_bytes = max_bytes
+
+        self._items = deque()
+        self._ready = asyncio.Event()
+        self._closed = False
+        self.audio_bytes = 0
+        self.total_bytes = 0
+
+    def _push(self, is_audio: bool, payload, received_at, event_type):
+        size = len(payload)
+        self._items.append((is_audio, payload, received_at, event_type))
+        self.total_bytes += size
+        relay_stats.queued_bytes[self.direction] += size
+        if len(self._items) > relay_stats.max_queue_depth[self.direction]:
+            relay_stats.max_queue_depth[self.direction] = len(self._items)
+        self._ready.set()
+
+    def _forget(self, is_audio: bool, payload, *_):
+        size = len(payload)
+        self.total_bytes -= size
+        relay_stats.queued_bytes[self.direction] -= size
+        if is_audio:
+            self.audio_bytes -= size
+
+    def put_audio(self, payload, received_at: float = None, event_type: str = None):
+        if self._closed:
+            return
+        while self.audio_bytes + len(payload) > self.max_audio_bytes and self.audio_bytes:
+            self._drop_oldest_audio()
+        self.audio_bytes += len(payload)
+        self._push(True, payload, received_at, event_type)
+
+    def put(self, payload, received_at: float = None, event_type: str = None):
+        if self._closed:
+            return
+        if self.total_bytes + len(payload) > self.max_bytes:
+            relay_stats.overflow_disconnects += 1
+            raise OutboxOverflow(f"{self.direction} backlog over {self.max_bytes} bytes")
+        self._push(False, payload, received_at, event_type)
+
+    def _drop_oldest_audio(self):
+        for i, (is_audio, payload, *_) in enumerate(self._items):
+            if is_audio:
+                del self._items[i]
+                self._forget(True, payload)
+                relay_stats.dropped_audio[self.direction] += 1
+                relay_stats.dropped_audio_bytes[self.direction] += len(payload)
+                return
+
+    async def run(self):
+        """Drain the queue into the socket until cancelled."""
+        try:
+            while True:
+                if not self._items:
+                    self._ready.clear()
+                    await self._ready.wait()
+                is_audio, payload, received_at, event_type = self._items.popleft()
+                self._forget(is_audio, payload)
+                if is_audio:
+                    await self._send_audio(payload)
+                else:
+                    await self._send_message(payload)
+                relay_stats.sent_bytes[self.direction] += len(payload)
+                if received_at is not None:
+                    forward_seconds.observe(time.perf_counter() - received_at, event_type)
+        finally:
+            self.close()
+
+    def close(self):
+        """Discard anything queued now or later, e.g. from a tool call that outlives the session."""
+        self._closed = True
+        while self._items:
+            self._forget(*self._items.popleft())
@@ -0,0 +1,135 @@
+from datetime import date, timedelta
+from sqlalchemy import select, delete, func, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import dialect_insert, rebuild_main, MileageRollup, Run
+
+
+def week_start(day: date) -> date:
+    """Monday of the ISO week containing day."""
+    return day - timedelta(days=day.weekday())
+
+
+def _upsert(rows: list):
+    """Insert rollup rows, adding onto any totals already stored for the same period."""
+    stmt = dialect_insert(MileageRollup).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "period", "period_start"],
+        set_={
+            "miles": MileageRollup.miles + stmt.excluded.miles,
+            "minutes": MileageRollup.minutes + stmt.excluded.minutes,
+            "num_runs": MileageRollup.num_runs + stmt.excluded.num_runs
+        }
+    )
+
+
+async def add_run(db: AsyncSession, user_id: int, run_date: date, miles: float, minutes: int):
+    """Fold one run into its day and week totals. Caller commits."""
+    values = {"user_id": user_id, "miles": miles, "minutes": minutes, "num_runs": 1}
+    await db.execute(_upsert([
+        {**values, "period": "day", "period_start": run_date},
+        {**values, "period": "week", "period_start": week_start(run_date)}
+    ]))
+
+
+async def add_runs(db: AsyncSession, user_id: int, runs: list):
+    """Fold many (run_date, miles, minutes) runs in at once, one row per period. Caller commits."""
+    periods = {}
+    for run_date, miles, minutes in runs:
+        for key in (("day", run_date), ("week", week_start(run_date))):
+            totals = periods.setdefault(key, [0.0, 0, 0])
+            totals[0] += miles
+            totals[1] += minutes
+            totals[2] += 1
+
+    rows = [
+        {"user_id": user_id, "period": period, "period_start": start, "miles": m, "minutes": mins, "num_runs": n}
+        for (period, start), (m, mins, n) in periods.items()
+    ]
+    # Stay well under SQLite's bound-parameter limit
+    for i in range(0, len(rows), 500):
+        await db.execute(_upsert(rows[i:i + 500]))
+
+
+async def get_totals(db: AsyncSession, user_id: int, start_date: date) -> tuple:
+    """(num_runs, miles, minutes) for runs on or after start_date.
+
+    Whole ISO weeks inside the range come from weekly rows and the ragged
+    edges from daily rows, so cost grows with weeks, not runs.
+    """
+    first_full_week = week_start(start_date + timedelta(days=6))
+    current_week = week_start(date.today())
+
+    result = await db.execute(
+        select(
+            func.coalesce(func.sum(MileageRollup.num_runs), 0),
+            func.coalesce(func.sum(MileageRollup.miles), 0.0),
+            func.coalesce(func.sum(MileageRollup.minutes), 0)
+        ).where(
+            MileageRollup.user_id == user_id,
+            or_(
+                and_(
+                    MileageRollup.period == "week",
+                    MileageRollup.period_start >= first_full_week,
+                    MileageRollup.period_start < current_week
+                ),
+                and_(
+                    MileageRollup.period == "day",
+                    MileageRollup.period_start >= start_date,
+                    or_(
+                        MileageRollup.period_start < first_full_week,
+                        MileageRollup.period_start >= current_week
+                    )
+                )
+            )
+        )
+    )
+    return tuple(result.one())
+
+
+async def rebuild(db: AsyncSession, user_id: int = None) -> int:
+    """Recompute rollups from the runs table. Returns the number of rollup rows written."""
+    clear = delete(MileageRollup)
+    daily = select(
+        Run.user_id,
+        Run.run_date,
+        func.sum(Run.distance_miles),
+        func.sum(Run.duration_minutes),
+        func.count(Run.id)
+    ).group_by(Run.user_id, Run.run_date)
+
+    if user_id is not None:
+        clear = clear.where(MileageRollup.user_id == user_id)
+        daily = daily.where(Run.user_id == user_id)
+
+    await db.execute(clear)
+
+    days = {}
+    weeks = {}
+    for uid, run_date, miles, minutes, count in await db.execute(daily):
+        if run_date is None:
+            continue
+        days[(uid, run_date)] = (miles or 0.0, minutes or 0, count)
+        week = weeks.setdefault((uid, week_start(run_date)), [0.0, 0, 0])
+        week[0] += miles or 0.0
+        week[1] += minutes or 0
+        week[2] += count
+
+    rows = [
+        {"user_id": uid, "period": "day", "period_start": d, "miles": m, "minutes": mins, "num_runs": n}
+        for (uid, d), (m, mins, n) in days.items()
+    ] + [
+        {"user_id": uid, "period": "week", "period_start": w, "miles": m, "minutes": mins, "num_runs": n}
+        for (uid, w), (m, mins, n) in weeks.items()
+    ]
+
+    if rows:
+        await db.execute(MileageRollup.__table__.insert(), rows)
+    await db.commit()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    rebuild_main(
+        rebuild, "Rebuild daily/weekly mileage rollups from the runs table.", "Rebuilt {count} mileage rollup rows"
+    )
@@ -0,0 +1,490 @@
+import os
+import io
+import re
+import csv
+import sys
+import gzip
+import math
+import codecs
+import asyncio
+import argparse
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+import xml.etree.ElementTree as ET
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import SessionLocal, init_db, Run
+from functions import _format_pace
+from context_cache import context_cache
+from training_events import training_events
+import rollups
+import training_load
+import race_prediction
+import personal_records
+
+# Runs inserted per transaction
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+IMPORT_CHUNK_SIZE = 64 * 1024
+FORMATS = ("gpx", "tcx", "csv")
+
+METERS_PER_MILE = 1609.344
+EARTH_RADIUS_M = 6371008.8
+# Anything shorter is a watch mis-tap, not a run
+MIN_DISTANCE_MILES = 0.05
+
+ParsedRun = namedtuple("ParsedRun", "run_date distance_miles duration_minutes notes")
+
+_TIMESTAMP = re.compile(
+    r"(\d{4})-(\d{2})-(\d{2})(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:\.(\d+))?)?)?\s*(Z|[+-]\d{2}:?\d{2})?"
+)
+
+
+def parse_timestamp(text: str) -> datetime:
+    """ISO 8601 as written by watches (Z suffix, any fraction digits); None if unparseable."""
+    match = _TIMESTAMP.match(text.strip()) if text else None
+    if not match:
+        return None
+    year, month, day, hour, minute, second, fraction, zone = match.groups()
+    tz = None
+    if zone == "Z":
+        tz = timezone.utc
+    elif zone:
+        sign = -1 if zone[0] == "-" else 1
+        digits = zone[1:].replace(":", "")
+        tz = timezone(sign * timedelta(hours=int(digits[:2]), minutes=int(digits[2:])))
+    return datetime(
+        int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0),
+        int((fraction or "0")[:6].ljust(6, "0")), tzinfo=tz
+    )
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _haversine_m(lat1, lon1, lat2, lon2) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def _parsed_run(start: datetime, distance_m: float, seconds: float, notes: str = None) -> ParsedRun:
+    if start is None or seconds <= 0:
+        return None
+    miles = round(distance_m / METERS_PER_MILE, 2)
+    if miles < MIN_DISTANCE_MILES:
+        return None
+    return ParsedRun(start.date(), miles, max(1, round(seconds / 60)), notes)
+
+
+class _XmlParser:
+    """Incremental XML parsing: feed() bytes as they arrive, get finished runs back.
+
+    Handled elements are detached from their parent once processed, so
+    memory stays flat no matter how many trackpoints a file holds.
+    Elements with missing or malformed values are skipped and counted.
+    """
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._stack = []
+        self.skipped = 0
+
+    def feed(self, data: bytes) -> list:
+        self._parser.feed(data)
+        return self._drain()
+
+    def close(self) -> list:
+        self._parser.close()
+        return self._drain()
+
+    def _drain(self) -> list:
+        runs = []
+        for event, elem in self._parser.read_events():
+            try:
+                if event == "start":
+                    self._stack.append(elem)
+                    self.start(_local(elem.tag), elem)
+                    continue
+                self._stack.pop()
+                run = self.end(_local(elem.tag), elem)
+            except (TypeError, ValueError):
+                self.skipped += 1
+                if event == "end":
+                    self._discard(elem)
+                continue
+            if run is not None:
+                runs.append(run)
+        return runs
+
+    def _parent_tag(self) -> str:
+        return _local(self._stack[-1].tag) if self._stack else None
+
+    def _discard(self, elem):
+        elem.clear()
+        if self._stack:
+            self._stack[-1].remove(elem)
+
+    def start(self, tag, elem):
+        pass
+
+    def end(self, tag, elem):
+        return None
+
+
+class GpxParser(_XmlParser):
+    """One run per <trk>: haversine distance over its points, first-to-last time."""
+
+    def start(self, tag, elem):
+        if tag == "trk":
+            self._distance = 0.0
+            self._first = self._last = None
+            self._prev = None
+            self._name = None
+
+    def end(self, tag, elem):
+        if tag == "trkpt":
+            lat, lon = float(elem.get("lat")), float(elem.get("lon"))
+            when = None
+            for child in elem:
+                if _local(child.tag) == "time":
+                    when = parse_timestamp(child.text)
+            if self._prev is not None:
+                self._distance += _haversine_m(self._prev[0], self._prev[1], lat, lon)
+            self._prev = (lat, lon)
+            if when is not None:
+                self._first = self._first or when
+                self._last = when
+            self._discard(elem)
+        elif tag == "name" and self._parent_tag() == "trk":
+            self._name = (elem.text or "").strip() or None
+        elif tag == "trk":
+            run = None
+            if self._first is not None:
+                run = _parsed_run(self._first, self._distance, (self._last - self._first).total_seconds(), self._name)
+            self._discard(elem)
+            return run
+        return None
+
+
+class TcxParser(_XmlParser):
+    """One run per running <Activity>, totalled from its laps."""
+
+    def start(self, tag, elem):
+        if tag == "Activity":
+            self._running = elem.get("Sport", "Running") == "Running"
+            self._start = None
+            self._distance = 0.0
+            self._seconds = 0.0
+            self._notes = None
+        elif tag == "Lap" and self._start is None:
+            self._start = parse_timestamp(elem.get("StartTime"))
+
+    def end(self, tag, elem):
+        parent = self._parent_tag()
+        if tag == "Trackpoint":
+            self._discard(elem)
+        elif tag == "Id" and parent == "Activity" and self._start is None:
+            self._start = parse_timestamp(elem.text)
+        elif tag == "TotalTimeSeconds" and parent == "Lap":
+            self._seconds += float(elem.text or 0)
+        elif tag == "DistanceMeters" and parent == "Lap":
+            self._distance += float(elem.text or 0)
+        elif tag == "Notes" and parent == "Activity":
+            self._notes = (elem.text or "").strip() or None
+        elif tag == "Activity":
+            run = _parsed_run(self._start, self._distance, self._seconds, self._notes) if self._running else None
+            self._discard(elem)
+            return run
+        return None
+
+
+def _duration_minutes(text: str) -> float:
+    """'1:05:30', '45:10' or plain minutes."""
+    parts = [float(p) for p in text.strip().split(":")]
+    if len(parts) == 1:
+        return parts[0]
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + part
+    return seconds / 60
+
+
+def _record_end(text: str, quoted: bool) -> tuple:
+    """(index of the last newline outside a quoted field or -1, whether text ends inside quotes)."""
+    cut = -1
+    offset = 0
+    for i, part in enumerate(text.split('"')):
+        if i:
+            quoted = not quoted
+        if not quoted:
+            newline = part.rfind("\n")
+            if newline != -1:
+                cut = offset + newline
+        offset += len(part) + 1
+    return cut, quoted
+
+
+class CsvParser:
+    """Rows with a date, a distance (miles or km) and a duration (minutes or H:MM:SS).
+
+    Only complete records are parsed each time; a trailing partial line,
+    or one inside an open quoted field, waits for the next chunk. Quote
+    parity is tracked over new text only, and a record that outgrows
+    MAX_RECORD_CHARS (or is still open at the end) is taken to be an
+    unbalanced quote: its first line is skipped and the rest re-read.
+    """
+
+    COLUMNS = {
+        "date": ("date", "run_date"),
+        "miles": ("distance_miles", "miles", "distance"),
+        "km": ("distance_km", "km"),
+        "minutes": ("duration_minutes", "minutes"),
+        "duration": ("duration", "time", "elapsed_time"),
+        "notes": ("notes", "name", "title"),
+    }
+    MAX_RECORD_CHARS = 1024 * 1024
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        self._pending = ""
+        self._quoted = False
+        self._skip_line = False
+        self._columns = None
+        self.skipped = 0
+
+    def feed(self, data: bytes) -> list:
+        return self._split(self._decoder.decode(data))
+
+    def close(self) -> list:
+        runs = self._split(self._decoder.decode(b"", final=True))
+        while self._quoted:
+            runs += self._recover()
+        text, self._pending = self._pending, ""
+        return runs + (self._parse(text) if text.strip() else [])
+
+    def _split(self, text: str) -> list:
+        """Parse the records `text` completes and keep the rest pending."""
+        if self._skip_line:
+            # Still inside an oversized line that was dropped
+            newline = text.find("\n")
+            if newline == -1:
+                return []
+            text = text[newline + 1:]
+            self._skip_line = False
+        runs = []
+        cut, self._quoted = _record_end(text, self._quoted)
+        if cut == -1:
+            self._pending += text
+        else:
+            runs = self._parse(self._pending + text[:cut + 1])
+            self._pending = text[cut + 1:]
+        while len(self._pending) > self.MAX_RECORD_CHARS:
+            runs += self._recover()
+        return runs
+
+    def _recover(self) -> list:
+        """Skip the pending record's first line, which opened the quote, and re-read what follows."""
+        self.skipped += 1
+        newline = self._pending.find("\n")
+        if newline == -1:
+            self._pending = ""
+            self._quoted = False
+            self._skip_line = True
+            return []
+        rest = self._pending[newline + 1:]
+        cut, self._quoted = _record_end(rest, False)
+        if cut == -1:
+            self._pending = rest
+            return []
+        self._pending = rest[cut + 1:]
+        return self._parse(rest[:cut + 1])
+
+    def _parse(self, text: str) -> list:
+        runs = []
+        reader = csv.reader(io.StringIO(text))
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                break
+            except csv.Error:
+                # e.g. a NUL byte or an oversized field; the reader resumes on the next line
+                self.skipped += 1
+                continue
+            if not row or not any(cell.strip() for cell in row):
+                continue
+            if self._columns is None:
+                header = [cell.strip().lower().replace(" ", "_") for cell in row]
+                self._columns = {
+                    key: next((header.index(n) for n in names if n in header), None)
+                    for key, names in self.COLUMNS.items()
+                }
+                continue
+            run = self._row(row)
+            if run is None:
+                self.skipped += 1
+            else:
+                runs.append(run)
+        return runs
+
+    def _cell(self, row, key):
+        index = self._columns[key]
+        if index is None or index >= len(row):
+            return None
+        return row[index].strip() or None
+
+    def _row(self, row) -> ParsedRun:
+        try:
+            start = parse_timestamp(self._cell(row, "date"))
+            if self._cell(row, "miles"):
+                meters = float(self._cell(row, "miles")) * METERS_PER_MILE
+            else:
+                meters = float(self._cell(row, "km")) * 1000
+            duration = self._cell(row, "minutes") or self._cell(row, "duration")
+            minutes = _duration_minutes(duration)
+        except (TypeError, ValueError):
+            return None
+        return _parsed_run(start, meters, minutes * 60, self._cell(row, "notes"))
+
+
+PARSERS = {"gpx": GpxParser, "tcx": TcxParser, "csv": CsvParser}
+
+
+class RunImporter:
+    """Dedupes parsed runs and writes them in batched transactions.
+
+    A run is a duplicate if this user already has one on the same date
+    with the same distance (to 0.01 mi), whether it's stored or earlier
+    in the same import.
+    """
+
+    def __init__(self, db: AsyncSession, user_id: int, batch_size: int = IMPORT_BATCH_SIZE):
+        self.db = db
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self._batch = []
+        self._seen = set()
+        self.imported = 0
+        self.duplicates = 0
+
+    async def add(self, runs: list):
+        for run in runs:
+            key = (run.run_date, run.distance_miles)
+            if key in self._seen:
+                self.duplicates += 1
+                continue
+            self._seen.add(key)
+            self._batch.append(run)
+            if len(self._batch) >= self.batch_size:
+                await self.flush()
+
+    async def flush(self):
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+
+        # Existing runs in this batch's date span, one query
+        result = await self.db.execute(
+            select(Run.run_date, Run.distance_miles).where(
+                Run.user_id == self.user_id,
+                Run.run_date >= min(r.run_date for r in batch),
+                Run.run_date <= max(r.run_date for r in batch)
+            )
+        )
+        existing = {(d, round(m or 0.0, 2)) for d, m in result}
+        new_runs = [r for r in batch if (r.run_date, r.distance_miles) not in existing]
+        self.duplicates += len(batch) - len(new_runs)
+        if not new_runs:
+            return
+
+        runs = [(r.run_date, r.distance_miles, r.duration_minutes) for r in new_runs]
+        async with training_load.user_lock(self.user_id):
+            # Before the insert, so a first-time state computed from history doesn't count them twice
+            await training_load.add_runs(self.db, self.user_id, [(r.run_date, r.duration_minutes) for r in new_runs])
+            await self.db.execute(insert(Run), [
+                {
+                    "user_id": self.user_id,
+                    "distance_miles": r.distance_miles,
+                    "duration_minutes": r.duration_minutes,
+                    "pace_per_mile": _format_pace(r.duration_minutes / r.distance_miles),
+                    "pace_seconds": personal_records.pace_seconds(r.distance_miles, r.duration_minutes),
+                    "notes": r.notes,
+                    "run_date": r.run_date
+                }
+                for r in new_runs
+            ])
+            await rollups.add_runs(self.db, self.user_id, runs)
+            await race_prediction.add_runs(self.db, self.user_id, runs)
+            await personal_records.add_runs(self.db, self.user_id, runs)
+            await self.db.commit()
+        self.imported += len(new_runs)
+
+    async def finish(self) -> dict:
+        await self.flush()
+        if self.imported:
+            context_cache.invalidate(self.user_id, "runs")
+            training_events.publish(self.user_id, {"type": "runs_imported", "count": self.imported})
+        return {"imported": self.imported, "duplicates": self.duplicates}
+
+
+async def import_chunks(importer: RunImporter, fmt: str, chunks) -> int:
+    """Stream one file's bytes (an async iterator) through the parser for `fmt`. Returns rows it couldn't use."""
+    parser = PARSERS[fmt]()
+    try:
+        async for chunk in chunks:
+            await importer.add(parser.feed(chunk))
+        await importer.add(parser.close())
+    except ET.ParseError as e:
+        raise ValueError(f"Invalid {fmt.upper()} file: {e}")
+    return parser.skipped
+
+
+def format_for(path: str) -> str:
+    name = path.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    ext = name.rsplit(".", 1)[-1]
+    return ext if ext in FORMATS else None
+
+
+async def _file_chunks(path: str):
+    opener = gzip.open if path.lower().endswith(".gz") else open
+    with opener(path, "rb") as f:
+        while True:
+            chunk = f.read(IMPORT_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def _main(user_id: int, paths: list):
+    await init_db()
+    skipped = 0
+    async with SessionLocal() as db:
+        importer = RunImporter(db, user_id)
+        try:
+            for path in paths:
+                fmt = format_for(path)
+                if fmt is None:
+                    print(f"Skipping {path}: not a .gpx, .tcx or .csv file", file=sys.stderr)
+                    continue
+                try:
+                    skipped += await import_chunks(importer, fmt, _file_chunks(path))
+                except ValueError as e:
+                    print(f"Skipping {path}: {e}", file=sys.stderr)
+        finally:
+            # Earlier batches are already committed; refresh caches and notify even if a file failed
+            summary = await importer.finish()
+    print(f"Imported {summary['imported']} runs ({summary['duplicates']} duplicates, {skipped} unusable rows)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import runs from GPX, TCX or CSV files (optionally .gz).")
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+    asyncio.run(_main(args.user_id, args.paths))
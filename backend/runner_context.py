@@ -0,0 +1,59 @@
+import os
+from datetime import date
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from functions import get_weekly_summary, get_running_history, get_goals, get_past_context
+
+# Roughly 300 tokens; lines past the budget are dropped, lowest priority first
+RUNNER_CONTEXT_BUDGET = int(os.getenv("RUNNER_CONTEXT_BUDGET", "1200"))
+
+INJURY_QUERY = "pain hurt hurting sore injury injured tight ache strain"
+
+CONTEXT_HEADER = """
+
+## What You Already Know About This Runner (as of {today})
+Use this for your first replies instead of calling get_weekly_summary or get_goals. Call the tools once they log something new or ask for more detail.
+"""
+
+
+async def build_runner_context(db: AsyncSession, user_id: int, budget: int = RUNNER_CONTEXT_BUDGET) -> str:
+    """Compact summary of recent training, goals and injury mentions for the session instructions."""
+    week = await get_weekly_summary(db, user_id)
+    history = await get_running_history(db, user_id)
+    goals = await get_goals(db, user_id)
+    injuries = await get_past_context(db, user_id, INJURY_QUERY)
+
+    lines = []
+    if week.get("num_runs"):
+        lines.append(
+            f"- Past 7 days: {week['total_miles']} miles across {week['num_runs']} runs "
+            f"(average pace {week['average_pace']}/mile)."
+        )
+    else:
+        lines.append("- No runs logged in the past 7 days.")
+    if history.get("num_runs"):
+        lines.append(
+            f"- Past {history['period_days']} days: {history['total_miles']} miles, "
+            f"about {history['avg_miles_per_week']} miles per week."
+        )
+        last = history["runs"][0]
+        notes = f" Notes: {last['notes']}" if last.get("notes") else ""
+        lines.append(f"- Last run {last['date']}: {last['distance']} miles in {last['duration']} min ({last['pace']}/mile).{notes}")
+
+    for goal in goals.get("goals", [])[:2]:
+        target = f", target {goal['target_time']}" if goal.get("target_time") else ""
+        lines.append(
+            f"- Goal: {goal['race_name']} ({goal['distance_miles']} miles) on {goal['race_date']}, "
+            f"{goal['days_until']} days away{target}."
+        )
+
+    for mention in [r for r in injuries.get("results", []) if r["role"] == "user"][:3]:
+        lines.append(f"- They said on {mention['date']}: \"{mention['content']}\"")
+
+    header = CONTEXT_HEADER.format(today=date.today().strftime("%A, %B %d"))
+    context = header
+    for line in lines:
+        if len(context) + len(line) + 1 > budget:
+            break
+        context += line + "\n"
+    return context if context != header else ""
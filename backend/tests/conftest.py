@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# A throwaway SQLite database; must be set before `database` is imported
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/stride_test.db"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
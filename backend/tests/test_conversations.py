@@ -0,0 +1,51 @@
+import asyncio
+import httpx
+from sqlalchemy import event
+
+from database import init_db, engine, SessionLocal, User, Conversation, Message
+from main import app
+
+
+async def _seed(user_id: int, conversations: int):
+    async with SessionLocal() as db:
+        db.add(User(id=user_id))
+        for i in range(conversations):
+            conversation = Conversation(user_id=user_id, title=f"Chat {i}")
+            conversation.messages = [Message(role="user", content="hi"), Message(role="assistant", content="hello")]
+            db.add(conversation)
+        await db.commit()
+
+
+async def _count_queries(user_id: int) -> tuple:
+    """(statements executed, conversations returned) for one conversations listing."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get(f"/api/users/{user_id}/conversations", params={"limit": 500})
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    return len(statements), response.json()
+
+
+def test_conversation_listing_query_count_is_constant():
+    async def run():
+        await init_db()
+        await _seed(1, 5)
+        await _seed(2, 200)
+        few, few_body = await _count_queries(1)
+        many, many_body = await _count_queries(2)
+        await engine.dispose()
+        return few, few_body, many, many_body
+
+    few, few_body, many, many_body = asyncio.run(run())
+    assert len(few_body) == 5
+    assert len(many_body) == 200
+    assert all(c["message_count"] == 2 for c in few_body + many_body)
+    assert few == many
@@ -0,0 +1,24 @@
+import asyncio
+
+from database import init_db, engine
+import memory
+
+
+def test_concurrent_cold_searches_share_one_load():
+    async def run():
+        await init_db()
+        index = memory.MemoryIndex()
+        searches = [asyncio.create_task(index.search(20, "sore knee", k=5)) for _ in range(3)]
+        await asyncio.sleep(0)
+        loads = set(index._loading.values())
+        # Saved while the load is reading the table, as transcript_writer would
+        index.add(20, 7, memory.embed("my knee is sore after the long run"))
+        results = await asyncio.gather(*searches)
+        hits = await index.search(20, "sore knee", k=5)
+        await engine.dispose()
+        return loads, results + [hits], index
+
+    loads, results, index = asyncio.run(run())
+    assert len(loads) == 1
+    assert all([message_id for message_id, _ in hits] == [7] for hits in results)
+    assert not index._loading and not index._arrivals
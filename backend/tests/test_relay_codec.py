@@ -0,0 +1,22 @@
+import numpy as np
+
+from relay_codec import VoiceGate, _ms_to_bytes
+
+SILENCE = bytes(_ms_to_bytes(20))
+SPEECH = (np.ones(len(SILENCE) // 2, dtype=np.int16) * 8000).tobytes()
+
+
+def test_voice_gate_with_zero_prefix_padding():
+    gate = VoiceGate(prefix_padding_ms=0, silence_duration_ms=500)
+    assert gate.push(SILENCE) is None
+    assert gate.push(SILENCE) is None
+    # Nothing from before the speech is replayed
+    assert gate.push(SPEECH) == SPEECH
+    assert gate.suppressed_bytes == 2 * len(SILENCE)
+
+
+def test_voice_gate_replays_prefix_padding():
+    gate = VoiceGate(prefix_padding_ms=40, silence_duration_ms=500)
+    for _ in range(5):
+        assert gate.push(SILENCE) is None
+    assert gate.push(SPEECH) == SILENCE * 2 + SPEECH
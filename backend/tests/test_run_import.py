@@ -0,0 +1,45 @@
+import asyncio
+
+from database import init_db, engine, SessionLocal, User
+import run_import
+
+ROWS = "".join(f"2026-03-{day:02d},{day % 5 + 3},{day % 5 * 9 + 27}\n" for day in range(1, 29))
+UNBALANCED = 'date,miles,minutes\n2026-02-27,"3,30\n' + ROWS
+
+
+def _chunks(data: bytes, size: int):
+    async def chunks():
+        for i in range(0, len(data), size):
+            yield data[i:i + size]
+    return chunks()
+
+
+def test_csv_rows_after_an_unbalanced_quote_are_imported():
+    async def run():
+        await init_db()
+        async with SessionLocal() as db:
+            db.add(User(id=10))
+            await db.commit()
+            importer = run_import.RunImporter(db, 10)
+            unusable = await run_import.import_chunks(importer, "csv", _chunks(UNBALANCED.encode(), 64))
+            summary = await importer.finish()
+        await engine.dispose()
+        return unusable, summary
+
+    unusable, summary = asyncio.run(run())
+    assert unusable == 1
+    assert summary == {"imported": 28, "duplicates": 0}
+
+
+def test_csv_pending_record_is_capped(monkeypatch):
+    monkeypatch.setattr(run_import.CsvParser, "MAX_RECORD_CHARS", 256)
+    data = (UNBALANCED * 20).encode()
+    parser = run_import.CsvParser()
+    runs = []
+    for i in range(0, len(data), 100):
+        runs += parser.feed(data[i:i + 100])
+        assert len(parser._pending) <= 256
+    runs += parser.close()
+    # Each copy's stray-quote line is skipped, and later copies' header lines fail to parse
+    assert len(runs) == 28 * 20
+    assert parser.skipped == 20 + 19
@@ -0,0 +1,74 @@
+from collections import defaultdict
+
+from database import Run, Goal
+
+
+def run_to_dict(run: Run) -> dict:
+    return {
+        "id": run.id,
+        "distance_miles": run.distance_miles,
+        "duration_minutes": run.duration_minutes,
+        "pace_per_mile": run.pace_per_mile,
+        "pace_seconds": run.pace_seconds,
+        "notes": run.notes,
+        "run_date": run.run_date.isoformat()
+    }
+
+
+def goal_to_dict(goal: Goal) -> dict:
+    return {
+        "id": goal.id,
+        "race_name": goal.race_name,
+        "race_date": goal.race_date.isoformat(),
+        "target_time": goal.target_time,
+        "distance_miles": goal.distance_miles
+    }
+
+
+class TrainingEvents:
+    """Fan-out of committed run/goal changes to each of a user's open chat sessions.
+
+    Subscribers are plain callables taking the event dict; the chat relay
+    passes one that queues the event on its client socket, so the
+    training log can apply the change without refetching.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self.published = 0
+
+    def subscribe(self, user_id: int, callback):
+        self._subscribers[user_id].add(callback)
+
+    def unsubscribe(self, user_id: int, callback):
+        subscribers = self._subscribers.get(user_id)
+        if subscribers is None:
+            return
+        subscribers.discard(callback)
+        if not subscribers:
+            del self._subscribers[user_id]
+
+    def publish(self, user_id: int, event: dict):
+        for callback in list(self._subscribers.get(user_id, ())):
+            try:
+                callback(event)
+                self.published += 1
+            except Exception as e:
+                print(f"Training event delivery error: {e}")
+
+    def run_logged(self, run: Run):
+        self.publish(run.user_id, {"type": "run_logged", "run": run_to_dict(run)})
+
+    def goal_set(self, goal: Goal):
+        self.publish(goal.user_id, {"type": "goal_set", "goal": goal_to_dict(goal)})
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "published": self.published
+        }
+
+
+# Shared by every request and voice session in this process
+training_events = TrainingEvents()
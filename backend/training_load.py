@@ -0,0 +1,183 @@
+import math
+import weakref
+import asyncio
+from datetime import date
+import numpy as np
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import dialect_insert, rebuild_main, Run, TrainingLoad
+
+# Banister-style time constants in days
+ATL_DAYS = 7
+CTL_DAYS = 42
+ATL_DECAY = math.exp(-1 / ATL_DAYS)
+CTL_DECAY = math.exp(-1 / CTL_DAYS)
+
+# Concurrent tool calls for one user fold into the same row; see user_lock()
+_locks = weakref.WeakValueDictionary()
+
+
+def user_lock(user_id: int) -> asyncio.Lock:
+    """Hold from add_runs() through the commit of the runs it folded, so updates to a user's state serialize."""
+    lock = _locks.get(user_id)
+    if lock is None:
+        lock = _locks[user_id] = asyncio.Lock()
+    return lock
+
+
+def run_load(minutes: float) -> float:
+    """Training impulse of one run; duration in minutes is the proxy we have for every run."""
+    return float(minutes or 0)
+
+
+def _fold(days: np.ndarray, loads: np.ndarray, as_of: int) -> tuple:
+    """(atl, ctl) at the end of day `as_of` (an ordinal) from per-run loads.
+
+    Each EWMA is linear, so a run on day d contributes
+    load * (1 - decay) * decay ** (as_of - d); no daily series is needed.
+    """
+    age = as_of - days
+    atl = float(np.dot(loads, ATL_DECAY ** age)) * (1 - ATL_DECAY)
+    ctl = float(np.dot(loads, CTL_DECAY ** age)) * (1 - CTL_DECAY)
+    return atl, ctl
+
+
+def apply_run(state: TrainingLoad, run_date: date, minutes: float):
+    """Fold one run into a stored state in O(1), including backdated runs."""
+    load = run_load(minutes)
+    if state.as_of is None:
+        state.as_of = run_date
+        state.atl = state.ctl = 0.0
+    if run_date > state.as_of:
+        gap = (run_date - state.as_of).days
+        state.atl *= ATL_DECAY ** gap
+        state.ctl *= CTL_DECAY ** gap
+        state.as_of = run_date
+    age = (state.as_of - run_date).days
+    state.atl += load * (1 - ATL_DECAY) * ATL_DECAY ** age
+    state.ctl += load * (1 - CTL_DECAY) * CTL_DECAY ** age
+
+
+async def _compute(db: AsyncSession, user_id: int) -> TrainingLoad:
+    """State from the user's stored runs, in one vectorized pass."""
+    result = await db.execute(
+        select(Run.run_date, Run.duration_minutes).where(
+            Run.user_id == user_id, Run.run_date.is_not(None)
+        )
+    )
+    rows = result.all()
+    state = TrainingLoad(user_id=user_id, as_of=None, atl=0.0, ctl=0.0)
+    if rows:
+        days = np.fromiter((d.toordinal() for d, _ in rows), dtype=np.int64, count=len(rows))
+        loads = np.fromiter((run_load(m) for _, m in rows), dtype=np.float64, count=len(rows))
+        as_of = int(days.max())
+        state.atl, state.ctl = _fold(days, loads, as_of)
+        state.as_of = date.fromordinal(as_of)
+    return state
+
+
+async def _insert(db: AsyncSession, state: TrainingLoad):
+    """Store a computed state unless another session already has."""
+    await db.execute(dialect_insert(TrainingLoad).values(
+        user_id=state.user_id, as_of=state.as_of, atl=state.atl, ctl=state.ctl
+    ).on_conflict_do_nothing(index_elements=["user_id"]))
+
+
+async def add_runs(db: AsyncSession, user_id: int, runs: list):
+    """Fold (run_date, minutes) pairs into the user's state.
+
+    Call under user_lock(user_id), before the runs are inserted, and
+    commit them together before releasing it.
+    """
+    state = await db.get(TrainingLoad, user_id, populate_existing=True)
+    if state is None:
+        # History doesn't include these runs yet, so they're folded in below as usual
+        await _insert(db, await _compute(db, user_id))
+        state = await db.get(TrainingLoad, user_id, populate_existing=True)
+    for run_date, minutes in runs:
+        apply_run(state, run_date, minutes)
+
+
+async def add_run(db: AsyncSession, user_id: int, run_date: date, minutes: float):
+    await add_runs(db, user_id, [(run_date, minutes)])
+
+
+def describe(atl: float, ctl: float) -> str:
+    tsb = ctl - atl
+    if ctl < 1 and atl < 1:
+        return "no recent training"
+    if tsb < -25:
+        return "overreaching - fatigue is well above fitness"
+    if tsb < -10:
+        return "productive fatigue - building fitness"
+    if tsb <= 5:
+        return "balanced"
+    return "fresh - well rested"
+
+
+async def get_state(db: AsyncSession, user_id: int, on: date = None) -> dict:
+    """ATL, CTL and TSB (load in minutes per day) decayed forward to `on`."""
+    state = await db.get(TrainingLoad, user_id)
+    if state is None:
+        async with user_lock(user_id):
+            state = await _compute(db, user_id)
+            # Only users with runs get a stored row
+            if state.as_of is not None:
+                await _insert(db, state)
+                await db.commit()
+
+    on = on or date.today()
+    atl, ctl = state.atl or 0.0, state.ctl or 0.0
+    if state.as_of is not None and on > state.as_of:
+        gap = (on - state.as_of).days
+        atl *= ATL_DECAY ** gap
+        ctl *= CTL_DECAY ** gap
+
+    return {
+        "atl": round(atl, 1),
+        "ctl": round(ctl, 1),
+        "tsb": round(ctl - atl, 1),
+        "ramp_ratio": round(atl / ctl, 2) if ctl >= 1 else None,
+        "status": describe(atl, ctl),
+        "as_of": on.isoformat()
+    }
+
+
+async def rebuild(db: AsyncSession, user_id: int = None) -> int:
+    """Recompute stored states from the runs table. Returns the number of users written."""
+    clear = delete(TrainingLoad)
+    runs = select(Run.user_id, Run.run_date, Run.duration_minutes).where(Run.run_date.is_not(None))
+    if user_id is not None:
+        clear = clear.where(TrainingLoad.user_id == user_id)
+        runs = runs.where(Run.user_id == user_id)
+    await db.execute(clear)
+
+    rows = (await db.execute(runs.order_by(Run.user_id))).all()
+    if not rows:
+        await db.commit()
+        return 0
+
+    users = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    days = np.fromiter((r[1].toordinal() for r in rows), dtype=np.int64, count=len(rows))
+    loads = np.fromiter((run_load(r[2]) for r in rows), dtype=np.float64, count=len(rows))
+
+    # Every user at once: per-user as_of, then segmented sums of the decayed loads
+    uids, starts = np.unique(users, return_index=True)
+    last = np.maximum.reduceat(days, starts)
+    age = np.repeat(last, np.diff(np.append(starts, len(rows)))) - days
+    atl = np.add.reduceat(loads * ATL_DECAY ** age, starts) * (1 - ATL_DECAY)
+    ctl = np.add.reduceat(loads * CTL_DECAY ** age, starts) * (1 - CTL_DECAY)
+
+    db.add_all(
+        TrainingLoad(user_id=int(u), as_of=date.fromordinal(int(d)), atl=float(a), ctl=float(c))
+        for u, d, a, c in zip(uids, last, atl, ctl)
+    )
+    await db.commit()
+    return len(uids)
+
+
+if __name__ == "__main__":
+    rebuild_main(
+        rebuild, "Rebuild ATL/CTL training-load state from the runs table.", "Rebuilt training load for {count} users"
+    )
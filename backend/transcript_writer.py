@@ -0,0 +1,153 @@
+import os
+import time
+import asyncio
+from datetime import datetime
+from sqlalchemy import insert
+
+from database import SessionLocal, Message
+import memory
+
+TRANSCRIPT_BATCH_SIZE = int(os.getenv("TRANSCRIPT_BATCH_SIZE", "50"))
+TRANSCRIPT_FLUSH_INTERVAL = float(os.getenv("TRANSCRIPT_FLUSH_INTERVAL", "1.0"))
+TRANSCRIPT_MAX_PENDING = int(os.getenv("TRANSCRIPT_MAX_PENDING", "10000"))
+
+
+class TranscriptWriter:
+    """Write-behind buffer that persists Message rows in bulk inserts.
+
+    Rows are flushed when the buffer reaches `batch_size` or every
+    `flush_interval` seconds, whichever comes first. Once `max_pending`
+    rows are waiting, new rows are dropped and counted rather than
+    letting memory grow without bound.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = TRANSCRIPT_BATCH_SIZE,
+        flush_interval: float = TRANSCRIPT_FLUSH_INTERVAL,
+        max_pending: int = TRANSCRIPT_MAX_PENDING
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._pending = []
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+        self.rows_written = 0
+        self.dropped_rows = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def start(self):
+        """Start the background flush loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write out anything still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def add(self, user_id: int, conversation_id: int, role: str, content: str) -> bool:
+        """Buffer a message for the next flush. Returns False if it was dropped."""
+        if len(self._pending) >= self.max_pending:
+            self.dropped_rows += 1
+            return False
+
+        self._pending.append({
+            "user_id": user_id,
+            "conversation_id": conversation_id,
+            "role": role,
+            "content": content,
+            # Stamp now so ordering reflects when it was said, not when it was flushed
+            "created_at": datetime.utcnow()
+        })
+
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    async def flush(self) -> int:
+        """Write all buffered rows in a single transaction."""
+        async with self._lock:
+            if not self._pending:
+                return 0
+
+            rows, self._pending = self._pending, []
+            start = time.perf_counter()
+
+            try:
+                async with SessionLocal() as db:
+                    result = await db.execute(
+                        insert(Message).returning(Message.id, Message.conversation_id, Message.content),
+                        [{k: v for k, v in row.items() if k != "user_id"} for row in rows]
+                    )
+                    entries = []
+                    if memory.SEMANTIC_MEMORY:
+                        # RETURNING order isn't guaranteed; a conversation maps to exactly one user
+                        owners = {row["conversation_id"]: row["user_id"] for row in rows}
+                        saved = [
+                            (message_id, owners[conversation_id], content)
+                            for message_id, conversation_id, content in result.all()
+                        ]
+                        entries = await memory.index_messages(db, saved)
+                    await db.commit()
+            except Exception as e:
+                print(f"Transcript flush error: {e}")
+                self.failed_flushes += 1
+                # Put the batch back in front of anything buffered meanwhile
+                room = max(self.max_pending - len(self._pending), 0)
+                self.dropped_rows += max(len(rows) - room, 0)
+                self._pending = rows[:room] + self._pending
+                return 0
+
+            for user_id, message_id, vector in entries:
+                memory.memory_index.add(user_id, message_id, vector)
+
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.flushes += 1
+            self.rows_written += len(rows)
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+            return len(rows)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def stats(self) -> dict:
+        """Counters for tuning batch size and flush interval."""
+        return {
+            "queue_depth": len(self._pending),
+            "rows_written": self.rows_written,
+            "dropped_rows": self.dropped_rows,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "avg_flush_ms": round(self._total_flush_ms / self.flushes, 3) if self.flushes else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 3),
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval
+        }
+
+
+# Shared by every voice session in this process
+transcript_writer = TranscriptWriter()
@@ -0,0 +1,159 @@
+import os
+import re
+import time
+import asyncio
+from collections import OrderedDict
+from urllib.parse import quote
+import httpx
+
+# {location} is substituted with the URL-encoded location; point this at a stub for tests
+WEATHER_URL = os.getenv("WEATHER_URL", "https://wttr.in/{location}?format=j1")
+WEATHER_TTL = float(os.getenv("WEATHER_TTL", "600"))
+WEATHER_STALE_TTL = float(os.getenv("WEATHER_STALE_TTL", "3600"))
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "1024"))
+
+
+def normalize_location(location: str) -> str:
+    """'  San Diego ,CA' and 'san diego, ca' share a cache entry."""
+    location = re.sub(r"\s+", " ", location.strip().lower())
+    return re.sub(r"\s*,\s*", ", ", location)
+
+
+class WeatherService:
+    """Current conditions with a pooled client, TTL cache and request coalescing.
+
+    Fresh entries are served straight from the cache. Entries older than
+    `ttl` but younger than `stale_ttl` are still served, and a background
+    refresh is kicked off. Concurrent misses for one location share a
+    single upstream request.
+    """
+
+    def __init__(
+        self,
+        url_template: str = WEATHER_URL,
+        ttl: float = WEATHER_TTL,
+        stale_ttl: float = WEATHER_STALE_TTL,
+        max_entries: int = WEATHER_CACHE_SIZE
+    ):
+        self.url_template = url_template
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+
+        self._client = None
+        self._cache = OrderedDict()
+        self._inflight = {}
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_requests = 0
+        self.upstream_errors = 0
+        self.last_upstream_ms = 0.0
+        self.max_upstream_ms = 0.0
+        self._total_upstream_ms = 0.0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=10.0,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get(self, location: str) -> dict:
+        """Current conditions for location; raises if there's nothing cached and upstream fails."""
+        key = normalize_location(location)
+        entry = self._cache.get(key)
+
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < self.ttl:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return entry[1]
+            if age < self.stale_ttl:
+                self.stale_hits += 1
+                self._cache.move_to_end(key)
+                self._refresh(key, location)
+                return entry[1]
+
+        self.misses += 1
+        if key in self._inflight:
+            self.coalesced += 1
+        return await asyncio.shield(self._refresh(key, location))
+
+    def _refresh(self, key: str, location: str) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key, location))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        return task
+
+    def _finish(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        # Background refreshes nobody awaits must not log "exception never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    async def _fetch(self, key: str, location: str) -> dict:
+        self.upstream_requests += 1
+        start = time.perf_counter()
+        try:
+            response = await self.client.get(
+                self.url_template.format(location=quote(location))
+            )
+            response.raise_for_status()
+            data = response.json()
+        except Exception:
+            self.upstream_errors += 1
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.last_upstream_ms = elapsed_ms
+            self.max_upstream_ms = max(self.max_upstream_ms, elapsed_ms)
+            self._total_upstream_ms += elapsed_ms
+
+        current = data["current_condition"][0]
+        conditions = {
+            "temp_f": current["temp_F"],
+            "feels_like_f": current["FeelsLikeF"],
+            "humidity": current["humidity"],
+            "conditions": current["weatherDesc"][0]["value"],
+            "wind_mph": current["windspeedMiles"]
+        }
+
+        self._cache[key] = (time.monotonic(), conditions)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return conditions
+
+    def stats(self) -> dict:
+        """Hit rate and upstream latency counters."""
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._cache),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            "upstream_requests": self.upstream_requests,
+            "upstream_errors": self.upstream_errors,
+            "last_upstream_ms": round(self.last_upstream_ms, 3),
+            "avg_upstream_ms": round(self._total_upstream_ms / self.upstream_requests, 3) if self.upstream_requests else 0.0,
+            "max_upstream_ms": round(self.max_upstream_ms, 3)
+        }
+
+
+# One pooled client and cache for the whole process
+weather_service = WeatherService()
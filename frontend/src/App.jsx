@@ -17,6 +17,7 @@ function App() {
     assistantTranscript,
     messages,
     functionCalls,
+    trainingEvents,
     error,
     connect,
     disconnect,
@@ -111,7 +112,7 @@ function App() {
             <div className="p-4 border-b border-gray-200">
               <h2 className="font-semibold text-gray-900">Training Log</h2>
             </div>
-            <TrainingLog userId={USER_ID} functionCalls={functionCalls} />
+            <TrainingLog userId={USER_ID} functionCalls={functionCalls} trainingEvents={trainingEvents} />
           </div>
         )}
       </div>
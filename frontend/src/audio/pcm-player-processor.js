@@ -0,0 +1,80 @@
+// Gapless PCM16 playback with a small jitter buffer, run on the audio thread.
+//
+// The main thread transfers each PCM16 ArrayBuffer from the socket straight
+// here. Samples are played back to back; playback starts once
+// `prebufferMs` is queued (or the first audio has waited that long, so a
+// short reply isn't held back), and an underrun re-primes the buffer
+// instead of stuttering on every late packet.
+
+class PcmPlayerProcessor extends AudioWorkletProcessor {
+  constructor(options) {
+    super();
+    const { prebufferMs = 80 } = options.processorOptions || {};
+    this.prebufferSamples = Math.round(sampleRate * prebufferMs / 1000);
+
+    this.chunks = [];
+    this.readOffset = 0;
+    this.buffered = 0;
+    this.waited = 0;
+    this.playing = false;
+
+    this.port.onmessage = (event) => {
+      const { type, pcm } = event.data;
+      if (type === 'audio') {
+        const int16 = new Int16Array(pcm);
+        const samples = new Float32Array(int16.length);
+        for (let i = 0; i < int16.length; i++) samples[i] = int16[i] / 32768;
+        this.chunks.push(samples);
+        this.buffered += samples.length;
+      } else if (type === 'clear') {
+        this.chunks = [];
+        this.readOffset = 0;
+        this.buffered = 0;
+        this.setPlaying(false);
+      }
+    };
+  }
+
+  setPlaying(playing) {
+    if (playing === this.playing) return;
+    this.playing = playing;
+    this.waited = 0;
+    this.port.postMessage({ type: 'playing', playing });
+  }
+
+  process(inputs, outputs) {
+    const output = outputs[0][0];
+
+    if (!this.playing) {
+      if (this.buffered === 0) return true;
+      this.waited += output.length;
+      if (this.buffered < this.prebufferSamples && this.waited < this.prebufferSamples) {
+        output.fill(0);
+        return true;
+      }
+      this.setPlaying(true);
+    }
+
+    let written = 0;
+    while (written < output.length && this.chunks.length > 0) {
+      const chunk = this.chunks[0];
+      const count = Math.min(output.length - written, chunk.length - this.readOffset);
+      output.set(chunk.subarray(this.readOffset, this.readOffset + count), written);
+      written += count;
+      this.readOffset += count;
+      this.buffered -= count;
+      if (this.readOffset === chunk.length) {
+        this.chunks.shift();
+        this.readOffset = 0;
+      }
+    }
+
+    if (written < output.length) {
+      output.fill(0, written);
+      this.setPlaying(false);
+    }
+    return true;
+  }
+}
+
+registerProcessor('pcm-player-processor', PcmPlayerProcessor);
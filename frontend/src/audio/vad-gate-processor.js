@@ -0,0 +1,147 @@
+// Energy-based voice activity gate, run on the audio thread.
+//
+// Only speech (plus padding) is posted back to the main thread, already
+// converted to PCM16 in a transferred ArrayBuffer, so silence and heavy
+// breathing between sentences never reach the socket. Padding
+// mirrors the server_vad settings in backend/prompts.py: the gate replays
+// `prefixPaddingMs` of audio from before speech started, and stays open for
+// `hangoverMs` after the last speech so the server still sees the
+// `silence_duration_ms` of quiet it needs to end the turn.
+
+const WINDOW_MS = 10;
+
+class VadGateProcessor extends AudioWorkletProcessor {
+  constructor(options) {
+    super();
+    const {
+      frameSize = 960,
+      prefixPaddingMs = 300,
+      hangoverMs = 700,
+      minLevelDb = -55,
+      marginDb = 12,
+      attackWindows = 2,
+    } = options.processorOptions || {};
+
+    this.frameSize = frameSize;
+    this.windowSize = Math.round(sampleRate * WINDOW_MS / 1000);
+    this.hangoverWindows = Math.ceil(hangoverMs / WINDOW_MS);
+    this.attackWindows = attackWindows;
+    this.minLevel = Math.pow(10, minLevelDb / 10);
+    this.margin = Math.pow(10, marginDb / 10);
+
+    // Mean-square energy of the background, tracked per 10 ms window
+    this.noiseFloor = this.minLevel;
+
+    this.window = new Float32Array(this.windowSize);
+    this.windowFill = 0;
+
+    // Ring buffer of recent windows, replayed when the gate opens
+    const prerollWindows = Math.max(1, Math.ceil(prefixPaddingMs / WINDOW_MS));
+    this.preroll = Array.from({ length: prerollWindows }, () => new Float32Array(this.windowSize));
+    this.prerollStart = 0;
+    this.prerollCount = 0;
+
+    this.frame = new Int16Array(frameSize);
+    this.frameFill = 0;
+
+    this.open = false;
+    this.speechRun = 0;
+    this.silenceRun = 0;
+
+    // The main thread asks for whatever is buffered when the mic stops
+    this.port.onmessage = (event) => {
+      if (event.data.type === 'flush') this.flush();
+    };
+  }
+
+  process(inputs) {
+    const input = inputs[0] && inputs[0][0];
+    if (!input) return true;
+
+    for (let i = 0; i < input.length; i++) {
+      this.window[this.windowFill++] = input[i];
+      if (this.windowFill === this.windowSize) {
+        this.handleWindow(this.window);
+        this.windowFill = 0;
+      }
+    }
+    return true;
+  }
+
+  handleWindow(samples) {
+    let energy = 0;
+    for (let i = 0; i < samples.length; i++) energy += samples[i] * samples[i];
+    energy /= samples.length;
+
+    const speech = energy > this.minLevel && energy > this.noiseFloor * this.margin;
+
+    // Drop quickly to quieter backgrounds, creep up slowly so sustained
+    // noise (wind, breathing) is eventually treated as background too
+    if (energy < this.noiseFloor) {
+      this.noiseFloor = Math.max(energy, 1e-10);
+    } else if (!speech || !this.open) {
+      this.noiseFloor += (energy - this.noiseFloor) * 0.002;
+    }
+
+    if (this.open) {
+      this.silenceRun = speech ? 0 : this.silenceRun + 1;
+      this.append(samples);
+      if (this.silenceRun >= this.hangoverWindows) {
+        this.open = false;
+        this.flush();
+        this.port.postMessage({ type: 'gate', open: false });
+      }
+      return;
+    }
+
+    const size = this.preroll.length;
+    if (this.prerollCount < size) {
+      this.preroll[(this.prerollStart + this.prerollCount++) % size].set(samples);
+    } else {
+      this.preroll[this.prerollStart].set(samples);
+      this.prerollStart = (this.prerollStart + 1) % size;
+    }
+
+    this.speechRun = speech ? this.speechRun + 1 : 0;
+    if (this.speechRun >= this.attackWindows) {
+      this.open = true;
+      this.silenceRun = 0;
+      this.speechRun = 0;
+      this.port.postMessage({ type: 'gate', open: true });
+      for (let i = 0; i < this.prerollCount; i++) {
+        this.append(this.preroll[(this.prerollStart + i) % size]);
+      }
+      this.prerollStart = 0;
+      this.prerollCount = 0;
+    }
+  }
+
+  append(samples) {
+    let offset = 0;
+    while (offset < samples.length) {
+      const count = Math.min(samples.length - offset, this.frameSize - this.frameFill);
+      for (let i = 0; i < count; i++) {
+        const s = samples[offset + i] * 32768;
+        this.frame[this.frameFill + i] = s > 32767 ? 32767 : s < -32768 ? -32768 : s;
+      }
+      this.frameFill += count;
+      offset += count;
+      if (this.frameFill === this.frameSize) this.flush();
+    }
+  }
+
+  flush() {
+    if (this.frameFill === 0) return;
+    let pcm = this.frame;
+    if (this.frameFill === this.frameSize) {
+      // Hand the full buffer over and start a fresh one instead of copying
+      this.frame = new Int16Array(this.frameSize);
+    } else {
+      pcm = this.frame.slice(0, this.frameFill);
+    }
+    this.port.postMessage({ type: 'audio', pcm: pcm.buffer }, [pcm.buffer]);
+    this.frameFill = 0;
+  }
+}
+
+registerProcessor('vad-gate-processor', VadGateProcessor);
@@ -1,14 +1,43 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 
-export function TrainingLog({ userId, functionCalls }) {
+const MAX_RUNS = 20;
+
+// Newest first, one entry per run id
+function mergeRuns(incoming, existing) {
+  const ids = new Set(incoming.map(r => r.id));
+  return [...incoming, ...existing.filter(r => !ids.has(r.id))]
+    .sort((a, b) => b.run_date.localeCompare(a.run_date) || b.id - a.id)
+    .slice(0, MAX_RUNS);
+}
+
+export function TrainingLog({ userId, functionCalls, trainingEvents = [] }) {
   const [runs, setRuns] = useState([]);
   const [weeklyStats, setWeeklyStats] = useState(null);
   const [loading, setLoading] = useState(true);
+  const appliedEventsRef = useRef(0);
 
-  // Fetch runs on mount and when function calls update (new run logged)
+  // Fetch runs once; after that the chat socket pushes new ones
   useEffect(() => {
     fetchRuns();
-  }, [userId, functionCalls]);
+  }, [userId]);
+
+  // Apply pushed run deltas locally instead of refetching
+  useEffect(() => {
+    const newEvents = trainingEvents.slice(appliedEventsRef.current);
+    appliedEventsRef.current = trainingEvents.length;
+    const newRuns = newEvents.filter(e => e.type === 'run_logged').map(e => e.run);
+    if (newRuns.length > 0) {
+      setRuns(prev => mergeRuns(newRuns, prev));
+    }
+    // A bulk import is too big to push row by row; reload the first page
+    if (newEvents.some(e => e.type === 'runs_imported')) {
+      fetchRuns();
+    }
+  }, [trainingEvents]);
+
+  useEffect(() => {
+    calculateWeeklyStats(runs);
+  }, [runs]);
 
   const fetchRuns = async () => {
     try {
@@ -16,8 +45,8 @@ export function TrainingLog({ userId, functionCalls }) {
       const response = await fetch(`${apiUrl}/api/users/${userId}/runs`);
       if (response.ok) {
         const data = await response.json();
-        setRuns(data);
-        calculateWeeklyStats(data);
+        // Keep anything pushed while the request was in flight
+        setRuns(prev => mergeRuns(data, prev));
       }
     } catch (err) {
       console.error('Failed to fetch runs:', err);
@@ -1,6 +1,21 @@
 import { useState, useRef, useCallback, useEffect } from 'react';
+import vadGateUrl from '../audio/vad-gate-processor.js?url';
+import pcmPlayerUrl from '../audio/pcm-player-processor.js?url';
 
 const SAMPLE_RATE = 24000;
+// Smaller capture frames cut latency; the relay still batches to AUDIO_CHUNK_MS upstream
+const FRAME_MS = Number(import.meta.env.VITE_AUDIO_FRAME_MS) || 40;
+// Audio queued before playback starts, to ride out network jitter
+const PLAYBACK_BUFFER_MS = Number(import.meta.env.VITE_PLAYBACK_BUFFER_MS) || 80;
+
+// Mirrors turn_detection in backend/prompts.py. The gate stays open a bit
+// longer than the server's silence window so server_vad still ends the turn.
+const SERVER_VAD = { prefixPaddingMs: 300, silenceDurationMs: 500 };
+const VAD_GATE = {
+  frameSize: Math.round(SAMPLE_RATE * FRAME_MS / 1000),
+  prefixPaddingMs: SERVER_VAD.prefixPaddingMs,
+  hangoverMs: SERVER_VAD.silenceDurationMs + 200,
+};
 
 export function useVoiceChat(userId) {
   const [isConnected, setIsConnected] = useState(false);
@@ -10,14 +25,51 @@ export function useVoiceChat(userId) {
   const [assistantTranscript, setAssistantTranscript] = useState('');
   const [messages, setMessages] = useState([]);
   const [functionCalls, setFunctionCalls] = useState([]);
+  const [trainingEvents, setTrainingEvents] = useState([]);
   const [error, setError] = useState(null);
   
   const wsRef = useRef(null);
   const audioContextRef = useRef(null);
+  const audioReadyRef = useRef(null);
+  const playerRef = useRef(null);
   const mediaStreamRef = useRef(null);
   const processorRef = useRef(null);
-  const playbackQueueRef = useRef([]);
-  const isPlayingRef = useRef(false);
+
+  // One AudioContext with both worklets loaded, created on first use
+  const ensureAudio = useCallback(() => {
+    if (!audioReadyRef.current) {
+      audioReadyRef.current = (async () => {
+        const context = new (window.AudioContext || window.webkitAudioContext)({
+          sampleRate: SAMPLE_RATE
+        });
+        await Promise.all([
+          context.audioWorklet.addModule(vadGateUrl),
+          context.audioWorklet.addModule(pcmPlayerUrl),
+        ]);
+        
+        const player = new AudioWorkletNode(context, 'pcm-player-processor', {
+          numberOfInputs: 0,
+          outputChannelCount: [1],
+          processorOptions: { prebufferMs: PLAYBACK_BUFFER_MS },
+        });
+        player.port.onmessage = (e) => {
+          if (e.data.type === 'playing') setIsSpeaking(e.data.playing);
+        };
+        player.connect(context.destination);
+        
+        audioContextRef.current = context;
+        playerRef.current = player;
+        return context;
+      })();
+    }
+    return audioReadyRef.current;
+  }, []);
+
+  // Hand PCM16 from the socket to the player worklet without copying it
+  const playAudio = useCallback(async (pcm) => {
+    await ensureAudio();
+    playerRef.current.port.postMessage({ type: 'audio', pcm }, [pcm]);
+  }, [ensureAudio]);
 
   // Connect to WebSocket
   const connect = useCallback(() => {
@@ -30,6 +82,7 @@ export function useVoiceChat(userId) {
     const wsUrl = `${wsProtocol}//${wsHost}/ws/chat/${userId}`;
     
     wsRef.current = new WebSocket(wsUrl);
+    wsRef.current.binaryType = 'arraybuffer';
     
     wsRef.current.onopen = () => {
       console.log('WebSocket connected');
@@ -47,12 +100,10 @@ export function useVoiceChat(userId) {
       setError('Connection error. Please try again.');
     };
     
-    wsRef.current.onmessage = async (event) => {
-      if (event.data instanceof Blob) {
+    wsRef.current.onmessage = (event) => {
+      if (event.data instanceof ArrayBuffer) {
         // Audio data from assistant
-        const arrayBuffer = await event.data.arrayBuffer();
-        playbackQueueRef.current.push(arrayBuffer);
-        playNextAudio();
+        playAudio(event.data);
       } else {
         // JSON message
         try {
@@ -63,7 +114,7 @@ export function useVoiceChat(userId) {
         }
       }
     };
-  }, [userId]);
+  }, [userId, playAudio]);
 
   // Handle incoming messages
   const handleMessage = useCallback((data) => {
@@ -91,53 +142,19 @@ export function useVoiceChat(userId) {
         }]);
         break;
       
+      case 'run_logged':
+      case 'goal_set':
+      case 'runs_imported':
+        // Committed changes pushed by the backend; the training log applies them
+        setTrainingEvents(prev => [...prev, data]);
+        break;
+      
       case 'error':
         setError(data.message);
         break;
     }
   }, []);
 
-  // Play audio from queue
-  const playNextAudio = useCallback(async () => {
-    if (isPlayingRef.current || playbackQueueRef.current.length === 0) return;
-    
-    isPlayingRef.current = true;
-    setIsSpeaking(true);
-    
-    if (!audioContextRef.current) {
-      audioContextRef.current = new (window.AudioContext || window.webkitAudioContext)({
-        sampleRate: SAMPLE_RATE
-      });
-    }
-    
-    while (playbackQueueRef.current.length > 0) {
-      const arrayBuffer = playbackQueueRef.current.shift();
-      
-      // Convert PCM16 to Float32
-      const int16Array = new Int16Array(arrayBuffer);
-      const float32Array = new Float32Array(int16Array.length);
-      for (let i = 0; i < int16Array.length; i++) {
-        float32Array[i] = int16Array[i] / 32768;
-      }
-      
-      // Create and play audio buffer
-      const audioBuffer = audioContextRef.current.createBuffer(1, float32Array.length, SAMPLE_RATE);
-      audioBuffer.getChannelData(0).set(float32Array);
-      
-      const source = audioContextRef.current.createBufferSource();
-      source.buffer = audioBuffer;
-      source.connect(audioContextRef.current.destination);
-      
-      await new Promise(resolve => {
-        source.onended = resolve;
-        source.start();
-      });
-    }
-    
-    isPlayingRef.current = false;
-    setIsSpeaking(false);
-  }, []);
-
   // Start listening
   const startListening = useCallback(async () => {
     if (!wsRef.current || wsRef.current.readyState !== WebSocket.OPEN) {
@@ -158,29 +175,25 @@ export function useVoiceChat(userId) {
       
       mediaStreamRef.current = stream;
       
-      audioContextRef.current = new (window.AudioContext || window.webkitAudioContext)({
-        sampleRate: SAMPLE_RATE
-      });
+      const context = await ensureAudio();
+      if (context.state === 'suspended') await context.resume();
       
-      const source = audioContextRef.current.createMediaStreamSource(stream);
-      processorRef.current = audioContextRef.current.createScriptProcessor(4096, 1, 1);
+      const source = context.createMediaStreamSource(stream);
       
-      processorRef.current.onaudioprocess = (e) => {
-        if (wsRef.current?.readyState === WebSocket.OPEN) {
-          const inputData = e.inputBuffer.getChannelData(0);
-          
-          // Convert Float32 to PCM16
-          const pcm16 = new Int16Array(inputData.length);
-          for (let i = 0; i < inputData.length; i++) {
-            pcm16[i] = Math.max(-32768, Math.min(32767, inputData[i] * 32768));
-          }
-          
-          wsRef.current.send(pcm16.buffer);
+      // Only speech (plus padding) comes back from the gate, already PCM16
+      processorRef.current = new AudioWorkletNode(context, 'vad-gate-processor', {
+        numberOfInputs: 1,
+        numberOfOutputs: 0,
+        processorOptions: VAD_GATE,
+      });
+      
+      processorRef.current.port.onmessage = (e) => {
+        if (e.data.type === 'audio' && wsRef.current?.readyState === WebSocket.OPEN) {
+          wsRef.current.send(e.data.pcm);
         }
       };
       
       source.connect(processorRef.current);
-      processorRef.current.connect(audioContextRef.current.destination);
       
       setIsListening(true);
       setUserTranscript('');
@@ -189,11 +202,13 @@ export function useVoiceChat(userId) {
       console.error('Error starting audio:', err);
       setError('Could not access microphone. Please check permissions.');
     }
-  }, []);
+  }, [ensureAudio]);
 
   // Stop listening
   const stopListening = useCallback(() => {
     if (processorRef.current) {
+      // Speech still buffered in the gate is sent once the worklet replies
+      processorRef.current.port.postMessage({ type: 'flush' });
       processorRef.current.disconnect();
       processorRef.current = null;
     }
@@ -224,6 +239,7 @@ export function useVoiceChat(userId) {
       wsRef.current.close();
       wsRef.current = null;
     }
+    playerRef.current?.port.postMessage({ type: 'clear' });
     setIsConnected(false);
   }, [stopListening]);
 
@@ -242,6 +258,7 @@ export function useVoiceChat(userId) {
     assistantTranscript,
     messages,
     functionCalls,
+    trainingEvents,
     error,
     connect,
     disconnect,